@@ -0,0 +1,41 @@
+"""link search indexes
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17 09:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+# Must match LINK_SEARCH_VECTOR in app/crud.py for the planner to use the index
+LINK_SEARCH_VECTOR = (
+    "to_tsvector('english'::regconfig, "
+    "coalesce(title, '') || ' ' || coalesce(description, '') || ' ' || short_code)"
+)
+
+
+def upgrade() -> None:
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    
+    # Trigram indexes serve the substring (ILIKE '%term%') search mode
+    op.execute("CREATE INDEX ix_links_title_trgm ON links USING gin (title gin_trgm_ops)")
+    op.execute("CREATE INDEX ix_links_description_trgm ON links USING gin (description gin_trgm_ops)")
+    op.execute("CREATE INDEX ix_links_short_code_trgm ON links USING gin (short_code gin_trgm_ops)")
+    
+    # Full-text index serves the ranked search mode
+    op.execute(f"CREATE INDEX ix_links_search_vector ON links USING gin (({LINK_SEARCH_VECTOR}))")
+
+
+def downgrade() -> None:
+    op.execute("DROP INDEX IF EXISTS ix_links_search_vector")
+    op.execute("DROP INDEX IF EXISTS ix_links_short_code_trgm")
+    op.execute("DROP INDEX IF EXISTS ix_links_description_trgm")
+    op.execute("DROP INDEX IF EXISTS ix_links_title_trgm")
@@ -0,0 +1,29 @@
+"""keyset pagination indexes
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Cursor pages seek on (created_at, id) in descending order
+    op.create_index('ix_links_created_at_id', 'links', ['created_at', 'id'], unique=False)
+    op.create_index('ix_audit_logs_link_id_created_at_id', 'audit_logs', ['link_id', 'created_at', 'id'], unique=False)
+    op.create_index('ix_audit_logs_user_id_created_at_id', 'audit_logs', ['user_id', 'created_at', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_audit_logs_user_id_created_at_id', table_name='audit_logs')
+    op.drop_index('ix_audit_logs_link_id_created_at_id', table_name='audit_logs')
+    op.drop_index('ix_links_created_at_id', table_name='links')
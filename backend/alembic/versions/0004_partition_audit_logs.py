@@ -0,0 +1,130 @@
+"""partition audit logs by month
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-17 11:00:00.000000
+
+"""
+from datetime import datetime, timedelta, timezone
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+AUDIT_COLUMNS = "id, user_id, link_id, action, details, ip_address, user_agent, created_at"
+
+# Partitions created ahead of the current month; app/retention.py keeps this topped up
+MONTHS_AHEAD = 3
+
+
+def _month_start(value: datetime) -> datetime:
+    return value.astimezone(timezone.utc).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def _next_month(month: datetime) -> datetime:
+    return (month + timedelta(days=32)).replace(day=1)
+
+
+# Must match partition_name/create_partition_sql in app/retention.py
+def _create_partition(month: datetime) -> None:
+    op.execute(
+        f"CREATE TABLE audit_logs_p{month:%Y_%m} PARTITION OF audit_logs "
+        f"FOR VALUES FROM ('{month:%Y-%m-%d} 00:00:00+00') TO ('{_next_month(month):%Y-%m-%d} 00:00:00+00')"
+    )
+
+
+def _audit_columns(created_at_nullable: bool) -> list:
+    return [
+        sa.Column('id', sa.Integer(), server_default=sa.text("nextval('audit_logs_id_seq')"), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('link_id', sa.Integer(), nullable=True),
+        sa.Column('action', sa.String(length=50), nullable=False),
+        sa.Column('details', sa.Text(), nullable=True),
+        sa.Column('ip_address', sa.String(length=45), nullable=True),
+        sa.Column('user_agent', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=created_at_nullable),
+        # Named explicitly, as Postgres would add a suffix while the set-aside table holds these names
+        sa.ForeignKeyConstraint(['link_id'], ['links.id'], name='audit_logs_link_id_fkey'),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], name='audit_logs_user_id_fkey'),
+    ]
+
+
+def _create_audit_indexes() -> None:
+    op.create_index(op.f('ix_audit_logs_id'), 'audit_logs', ['id'], unique=False)
+    # Per link and per user history, newest first; id breaks ties for cursor pages
+    op.create_index('ix_audit_logs_link_id_created_at_id', 'audit_logs', ['link_id', 'created_at', 'id'], unique=False)
+    op.create_index('ix_audit_logs_user_id_created_at_id', 'audit_logs', ['user_id', 'created_at', 'id'], unique=False)
+
+
+def _set_aside_audit_logs(name: str) -> None:
+    """Rename audit_logs out of the way, keeping its id sequence for the replacement"""
+    op.execute("ALTER SEQUENCE audit_logs_id_seq OWNED BY NONE")
+    op.drop_index('ix_audit_logs_user_id_created_at_id', table_name='audit_logs')
+    op.drop_index('ix_audit_logs_link_id_created_at_id', table_name='audit_logs')
+    op.drop_index(op.f('ix_audit_logs_id'), table_name='audit_logs')
+    op.execute(f"ALTER TABLE audit_logs RENAME TO {name}")
+    op.execute(f"ALTER TABLE {name} RENAME CONSTRAINT audit_logs_pkey TO {name}_pkey")
+
+
+def upgrade() -> None:
+    # The table is rewritten, so run this in a maintenance window on large databases
+    _set_aside_audit_logs('audit_logs_unpartitioned')
+    
+    # A partitioned table's primary key has to include the partition key
+    op.create_table(
+        'audit_logs',
+        *_audit_columns(created_at_nullable=False),
+        sa.PrimaryKeyConstraint('id', 'created_at'),
+        postgresql_partition_by='RANGE (created_at)'
+    )
+    
+    now = datetime.now(timezone.utc)
+    oldest = op.get_bind().execute(sa.text("SELECT min(created_at) FROM audit_logs_unpartitioned")).scalar()
+    month = _month_start(min(oldest, now) if oldest else now)
+    last = _month_start(now)
+    for _ in range(MONTHS_AHEAD):
+        last = _next_month(last)
+    while month <= last:
+        _create_partition(month)
+        month = _next_month(month)
+    # Catches rows outside the monthly partitions instead of rejecting them
+    op.execute("CREATE TABLE audit_logs_default PARTITION OF audit_logs DEFAULT")
+    
+    op.execute(
+        f"INSERT INTO audit_logs ({AUDIT_COLUMNS}) "
+        f"SELECT {AUDIT_COLUMNS.replace('created_at', 'coalesce(created_at, now())')} FROM audit_logs_unpartitioned"
+    )
+    op.drop_table('audit_logs_unpartitioned')
+    op.execute("ALTER SEQUENCE audit_logs_id_seq OWNED BY audit_logs.id")
+    _create_audit_indexes()
+    
+    # Daily access totals kept after old partitions are dropped
+    op.create_table(
+        'audit_access_daily',
+        sa.Column('link_id', sa.Integer(), nullable=False),
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('accesses', sa.BigInteger(), nullable=False),
+        sa.Column('unique_ips', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('link_id', 'day')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('audit_access_daily')
+    
+    _set_aside_audit_logs('audit_logs_partitioned')
+    op.create_table(
+        'audit_logs',
+        *_audit_columns(created_at_nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.execute(f"INSERT INTO audit_logs ({AUDIT_COLUMNS}) SELECT {AUDIT_COLUMNS} FROM audit_logs_partitioned")
+    # Dropping the parent drops every partition with it
+    op.drop_table('audit_logs_partitioned')
+    op.execute("ALTER SEQUENCE audit_logs_id_seq OWNED BY audit_logs.id")
+    _create_audit_indexes()
@@ -0,0 +1,33 @@
+"""link click rollups
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-17 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0005'
+down_revision = '0004'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # The primary key serves range reads for one link at one granularity
+    op.create_table(
+        'link_click_rollups',
+        sa.Column('link_id', sa.Integer(), nullable=False),
+        sa.Column('granularity', sa.String(length=4), nullable=False),
+        sa.Column('bucket_start', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('clicks', sa.BigInteger(), nullable=False),
+        sa.Column('unique_visitors', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('link_id', 'granularity', 'bucket_start')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('link_click_rollups')
@@ -0,0 +1,32 @@
+"""write behind flushes
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-17 18:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0006'
+down_revision = '0005'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'write_behind_flushes',
+        sa.Column('flush_id', sa.String(length=32), nullable=False),
+        sa.Column('name', sa.String(length=50), nullable=False),
+        sa.Column('applied_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.PrimaryKeyConstraint('flush_id')
+    )
+    op.create_index('ix_write_behind_flushes_applied_at', 'write_behind_flushes', ['applied_at'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_write_behind_flushes_applied_at', table_name='write_behind_flushes')
+    op.drop_table('write_behind_flushes')
@@ -0,0 +1,135 @@
+import logging
+import math
+from collections import Counter, defaultdict
+from datetime import datetime, timezone
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.cache import redis_client
+from app.config import settings
+from app.crud import CRUDLinkClickRollup
+from app.writebehind import WriteBehindFlusher, run_flusher
+
+logger = logging.getLogger(__name__)
+
+# Bucket sizes in seconds; buckets start on UTC boundaries
+GRANULARITIES = {"hour": 3600, "day": 86400}
+
+# Clicks accumulate in the pending hash (field = "<link id>:<hour start>") until
+# a flush moves it to the flushing hash and adds it to link_click_rollups
+# (see app/writebehind.py).
+# Daily rows are summed from the hourly buckets at flush time.
+PENDING_KEY = "link_stats:pending"
+FLUSHING_KEY = "link_stats:flushing"
+
+LINK_STATS_FLUSHER = WriteBehindFlusher(
+    "link_stats",
+    pending_keys=[PENDING_KEY],
+    flushing_keys=[FLUSHING_KEY],
+    lock_seconds=settings.link_stats_flush_lock_seconds
+)
+
+# One HyperLogLog of visitors (address and user agent) per link and bucket,
+# kept for a while after the bucket ends so the last flush can still read it
+VISITORS_KEY = "link_stats:visitors:{granularity}:{link_id}:{bucket}"
+VISITORS_GRACE_SECONDS = 3600
+
+
+def bucket_start(timestamp: float, granularity: str) -> int:
+    """Epoch seconds of the bucket containing a timestamp"""
+    size = GRANULARITIES[granularity]
+    return int(timestamp // size * size)
+
+
+class LinkStatsService:
+    """Hourly and daily click series maintained from access events"""
+    
+    @staticmethod
+    async def record_events(events: list[dict]) -> bool:
+        """Count a batch of audit events' link accesses in a single round trip"""
+        clicks: Counter = Counter()
+        visitors: dict[tuple[str, int, int], set] = defaultdict(set)
+        for event in events:
+            if event["action"] != "access" or event["link_id"] is None:
+                continue
+            timestamp = event["created_at"].timestamp()
+            clicks[f"{event['link_id']}:{bucket_start(timestamp, 'hour')}"] += 1
+            visitor = f"{event['ip_address'] or ''}|{event['user_agent'] or ''}"
+            for granularity in GRANULARITIES:
+                visitors[(granularity, event["link_id"], bucket_start(timestamp, granularity))].add(visitor)
+        if not clicks:
+            return True
+        
+        try:
+            pipe = redis_client.pipeline(transaction=False)
+            for field, count in clicks.items():
+                pipe.hincrby(PENDING_KEY, field, count)
+            for (granularity, link_id, bucket), members in visitors.items():
+                key = VISITORS_KEY.format(granularity=granularity, link_id=link_id, bucket=bucket)
+                pipe.pfadd(key, *members)
+                pipe.expireat(key, bucket + GRANULARITIES[granularity] + VISITORS_GRACE_SECONDS)
+            await pipe.execute()
+            return True
+        except Exception:
+            logger.warning("Failed to record %d link accesses in the click series", sum(clicks.values()))
+            return False
+    
+    @staticmethod
+    async def flush() -> int:
+        """Add pending clicks to the rollup table, returning the number of buckets written"""
+        return await LINK_STATS_FLUSHER.run(LinkStatsService._apply)
+    
+    @staticmethod
+    async def _apply(db: AsyncSession, pending: dict) -> int:
+        buckets: Counter = Counter()
+        for field, count in pending.items():
+            link_id, hour = (int(part) for part in field.split(":"))
+            buckets[("hour", link_id, hour)] += int(count)
+            buckets[("day", link_id, bucket_start(hour, "day"))] += int(count)
+        
+        pipe = redis_client.pipeline(transaction=False)
+        for granularity, link_id, bucket in buckets:
+            pipe.pfcount(VISITORS_KEY.format(granularity=granularity, link_id=link_id, bucket=bucket))
+        unique_visitors = await pipe.execute()
+        
+        rows = [
+            {
+                "link_id": link_id,
+                "granularity": granularity,
+                "bucket_start": datetime.fromtimestamp(bucket, tz=timezone.utc),
+                "clicks": clicks,
+                "unique_visitors": unique,
+            }
+            for ((granularity, link_id, bucket), clicks), unique in zip(buckets.items(), unique_visitors)
+        ]
+        await CRUDLinkClickRollup.apply(db, rows)
+        return len(rows)
+    
+    @staticmethod
+    async def get_series(
+        db: AsyncSession,
+        link_id: int,
+        granularity: str,
+        start: datetime,
+        end: datetime
+    ) -> list[dict]:
+        """Every bucket from the one containing start up to end, with empty buckets as zero"""
+        first = bucket_start(start.timestamp(), granularity)
+        rows = {
+            int(row.bucket_start.timestamp()): row
+            for row in await CRUDLinkClickRollup.get_series(
+                db, link_id, granularity, datetime.fromtimestamp(first, tz=timezone.utc), end
+            )
+        }
+        points = []
+        for bucket in range(first, math.ceil(end.timestamp()), GRANULARITIES[granularity]):
+            row = rows.get(bucket)
+            points.append({
+                "bucket_start": datetime.fromtimestamp(bucket, tz=timezone.utc),
+                "clicks": row.clicks if row else 0,
+                "unique_visitors": row.unique_visitors if row else 0,
+            })
+        return points
+
+
+async def run_link_stats_flusher() -> None:
+    """Flush click series buckets every interval until cancelled"""
+    await run_flusher(LinkStatsService.flush, settings.link_stats_flush_interval_seconds, "Click series")
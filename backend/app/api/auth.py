@@ -1,23 +1,28 @@
 from datetime import timedelta
+from typing import Optional
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
-from app.database import get_db
-from app.auth import authenticate_user, create_access_token, get_current_active_user
-from app.crud import CRUDUser
-from app.schemas import Token, User, UserCreate
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import get_async_db
+from app.auth import authenticate_user, create_access_token, get_current_active_user, get_current_admin_user
+from app.crud import CRUDAuditLog, CRUDUser
+from app.pagination import get_cursor, next_cursor
+from app.ratelimit import rate_limit
+from app.replicas import get_read_db, get_write_db
+from app.schemas import AuditLogList, Token, User, UserAdminUpdate, UserCreate
+from app.user_cache import UserCache
 from app.config import settings
 
 router = APIRouter(prefix="/auth", tags=["authentication"])
 
 
-@router.post("/token", response_model=Token)
+@router.post("/token", response_model=Token, dependencies=[Depends(rate_limit("login"))])
 async def login_for_access_token(
     form_data: OAuth2PasswordRequestForm = Depends(),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Login endpoint to get access token"""
-    user = authenticate_user(db, form_data.username, form_data.password)
+    user = await authenticate_user(db, form_data.username, form_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -36,27 +41,60 @@ async def login_for_access_token(
 @router.post("/register", response_model=User)
 async def register_user(
     user: UserCreate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Register a new user"""
     # Check if username already exists
-    if CRUDUser.get_by_username(db, user.username):
+    if await CRUDUser.get_by_username(db, user.username):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Username already registered"
         )
     
     # Check if email already exists
-    if CRUDUser.get_by_email(db, user.email):
+    if await CRUDUser.get_by_email(db, user.email):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Email already registered"
         )
     
-    return CRUDUser.create(db, user)
+    return await CRUDUser.create(db, user)
+
+
+@router.patch("/users/{user_id}", response_model=User)
+async def update_user(
+    user_id: int,
+    user_update: UserAdminUpdate,
+    current_user: User = Depends(get_current_admin_user),
+    db: AsyncSession = Depends(get_write_db)
+):
+    """Activate/deactivate a user or change their admin flag (admin only)"""
+    db_user = await CRUDUser.update(db, user_id, user_update)
+    if not db_user:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="User not found"
+        )
+    
+    # Cached copies on every worker must not outlive the change
+    await UserCache.invalidate(db_user.username)
+    return db_user
 
 
 @router.get("/me", response_model=User)
 async def read_users_me(current_user: User = Depends(get_current_active_user)):
     """Get current user information"""
-    return current_user 
\ No newline at end of file
+    return current_user 
+
+
+@router.get("/me/audit", response_model=AuditLogList)
+async def read_my_audit_logs(
+    skip: int = 0,
+    limit: int = 100,
+    after: Optional[tuple] = Depends(get_cursor),
+    current_user: User = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """List the current user's audit log entries, newest first"""
+    audit_logs = await CRUDAuditLog.get_by_user(db, current_user.id, skip=skip, limit=limit, after=after)
+    return AuditLogList(audit_logs=audit_logs, next_cursor=next_cursor(audit_logs, limit))
@@ -1,37 +1,57 @@
+from datetime import datetime, timedelta, timezone
 from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException, status, Request, Response
-from fastapi.responses import RedirectResponse
-from sqlalchemy.orm import Session
-from app.database import get_db
-from app.auth import get_current_active_user
+from fastapi import APIRouter, Depends, HTTPException, Query, status, Request, Response
+from fastapi.responses import RedirectResponse, StreamingResponse
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.config import settings
+from app.database import get_async_db
+from app.auth import get_current_active_user, get_current_admin_user
 from app.crud import CRUDLink, CRUDAuditLog
-from app.cache import CacheService
+from app.analytics import GRANULARITIES, LinkStatsService
+from app.audit import audit_pipeline
+from app.bloom import short_code_filter
+from app.bulk import MEDIA_TYPES, BulkLinkService, iter_records
+from app.cache import CacheService, link_cache_data
+from app.counters import AccessCounterService
 from app.models import User
-from app.schemas import Link, LinkCreate, LinkUpdate, LinkList, LinkStats
+from app.resolver import LinkResolver
+from app.pagination import get_cursor, next_cursor
+from app.ratelimit import rate_limit
+from app.replicas import ReadRouting, get_read_db, get_write_db
+from app.schemas import AuditLogList, BatchResolveRequest, BatchResolveResult, BulkImportResult, Link, LinkCreate, LinkUpdate, LinkList, LinkStats, LinkStatsSeries
 
 router = APIRouter(prefix="/links", tags=["links"])
 
 
-@router.post("/", response_model=Link)
+@router.post("/", response_model=Link, dependencies=[Depends(rate_limit("create"))])
 async def create_link(
     link: LinkCreate,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_write_db),
     request: Request = None
 ):
     """Create a new link"""
-    # Check if short_code already exists
-    if CRUDLink.get_by_short_code(db, link.short_code):
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Short code already exists"
-        )
+    short_code_taken = HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail="Short code already exists"
+    )
+    
+    # Check if short_code already exists (the filter rules out most new codes without a query)
+    if short_code_filter.might_contain(link.short_code) and await CRUDLink.get_by_short_code(db, link.short_code):
+        raise short_code_taken
     
-    # Create the link
-    db_link = CRUDLink.create(db, link, current_user.id)
+    # Create the link; the unique constraint catches codes the filter has not seen yet
+    try:
+        db_link = await CRUDLink.create(db, link, current_user.id)
+    except IntegrityError:
+        await db.rollback()
+        raise short_code_taken
+    await short_code_filter.add(db_link.short_code)
+    await ReadRouting.mark_links_written([db_link.short_code])
     
     # Log the action
-    CRUDAuditLog.create(
+    await CRUDAuditLog.create(
         db=db,
         user_id=current_user.id,
         action="create",
@@ -41,27 +61,50 @@ async def create_link(
         user_agent=request.headers.get("user-agent") if request else None
     )
     
-    # Cache the link
-    link_data = {
-        "id": db_link.id,
-        "short_code": db_link.short_code,
-        "target_url": db_link.target_url,
-        "title": db_link.title,
-        "is_active": db_link.is_active
-    }
-    CacheService.set_link(db_link.short_code, link_data)
+    # Cache the link, replacing any tombstone on every worker
+    await CacheService.set_link(db_link.short_code, link_cache_data(db_link), broadcast=True)
     
     return db_link
 
 
+@router.post("/bulk/import", response_model=BulkImportResult)
+async def import_links(
+    request: Request,
+    file_format: str = Query("csv", alias="format", pattern="^(csv|ndjson)$"),
+    current_user: User = Depends(get_current_admin_user),
+    db: AsyncSession = Depends(get_write_db)
+):
+    """Import links from a streamed CSV or NDJSON body, owned by the caller"""
+    return await BulkLinkService.import_links(
+        db,
+        iter_records(request.stream(), file_format),
+        current_user.id,
+        ip_address=request.client.host if request.client else None,
+        user_agent=request.headers.get("user-agent")
+    )
+
+
+@router.get("/bulk/export")
+async def export_links(
+    file_format: str = Query("csv", alias="format", pattern="^(csv|ndjson)$"),
+    current_user: User = Depends(get_current_active_user)
+):
+    """Stream all links as CSV or NDJSON"""
+    return StreamingResponse(
+        BulkLinkService.export_links(file_format),
+        media_type=MEDIA_TYPES[file_format],
+        headers={"Content-Disposition": f'attachment; filename="links.{file_format}"'}
+    )
+
+
 @router.get("/stats/{short_code}", response_model=LinkStats)
 async def get_link_stats(
     short_code: str,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get statistics for a link"""
-    db_link = CRUDLink.get_by_short_code(db, short_code)
+    db_link = await CRUDLink.get_by_short_code(db, short_code)
     if not db_link:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -75,76 +118,152 @@ async def get_link_stats(
             detail="Not enough permissions"
         )
     
+    # Merge clicks that are still waiting to be flushed to the database. Read from the
+    # primary: a replica may not have a flush yet whose pending clicks are already gone
+    pending_count, pending_last_accessed = await AccessCounterService.get_pending(db_link.id)
+    last_accessed = db_link.last_accessed
+    if pending_last_accessed and (not last_accessed or pending_last_accessed > last_accessed):
+        last_accessed = pending_last_accessed
+    
     return LinkStats(
         short_code=db_link.short_code,
-        access_count=db_link.access_count,
-        last_accessed=db_link.last_accessed,
+        access_count=(db_link.access_count or 0) + pending_count,
+        last_accessed=last_accessed,
         created_at=db_link.created_at
     )
 
 
-@router.get("/{short_code}")
-async def resolve_link(
+@router.get("/stats/{short_code}/series", response_model=LinkStatsSeries)
+async def get_link_stats_series(
     short_code: str,
-    db: Session = Depends(get_db),
+    granularity: str = Query("day", pattern="^(hour|day)$"),
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    current_user: User = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """Clicks and approximate unique visitors per hour or day (default: the last 30 days or 48 hours)"""
+    # Times without an offset are taken as UTC
+    end = end or datetime.now(timezone.utc)
+    if end.tzinfo is None:
+        end = end.replace(tzinfo=timezone.utc)
+    if start is None:
+        start = end - (timedelta(days=30) if granularity == "day" else timedelta(hours=48))
+    elif start.tzinfo is None:
+        start = start.replace(tzinfo=timezone.utc)
+    if start >= end:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="start must be before end"
+        )
+    if (end - start).total_seconds() / GRANULARITIES[granularity] > settings.link_stats_max_points:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {settings.link_stats_max_points} {granularity} buckets per request"
+        )
+    
+    db_link = await CRUDLink.get_by_short_code(db, short_code)
+    if not db_link:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Link not found"
+        )
+    
+    # Check if user owns the link or is admin
+    if db_link.created_by != current_user.id and not current_user.is_admin:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not enough permissions"
+        )
+    
+    # One rollup row per bucket, so a 90 day chart reads at most 90 rows
+    points = await LinkStatsService.get_series(db, db_link.id, granularity, start, end)
+    return LinkStatsSeries(
+        short_code=db_link.short_code,
+        granularity=granularity,
+        start=start,
+        end=end,
+        total_clicks=sum(point["clicks"] for point in points),
+        points=points
+    )
+
+
+@router.post("/resolve", response_model=BatchResolveResult, dependencies=[Depends(rate_limit("resolve"))])
+async def resolve_links(
+    batch: BatchResolveRequest,
     request: Request = None
 ):
-    """Resolve a short link to its target URL"""
-    # Try to get from cache first
-    cached_link = CacheService.get_link(short_code)
+    """Resolve many short codes to their target URLs in one request"""
+    # Checked before deduplicating, so an oversized batch costs no further work
+    if len(batch.short_codes) > settings.batch_resolve_max_codes:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {settings.batch_resolve_max_codes} short codes per request"
+        )
+    short_codes = list(dict.fromkeys(batch.short_codes))
+    
+    # Codes the filter has never seen are answered without any I/O
+    candidates = [short_code for short_code in short_codes if short_code_filter.might_contain(short_code)]
+    resolved = await LinkResolver.resolve_many(candidates) if candidates else {}
+    links = {
+        short_code: resolved[short_code]
+        for short_code in candidates
+        if resolved[short_code].get("is_active")
+    }
     
-    if cached_link and cached_link.get("is_active"):
-        # Increment access count in cache
-        CacheService.increment_access_count(short_code)
-        
-        # Log the access
-        if cached_link.get("id"):
-            CRUDAuditLog.create(
-                db=db,
-                user_id=1,  # Anonymous user
-                action="access",
-                link_id=cached_link["id"],
-                details=f"Accessed link: {short_code}",
-                ip_address=request.client.host if request else None,
-                user_agent=request.headers.get("user-agent") if request else None
-            )
-        
-        return RedirectResponse(url=cached_link["target_url"])
+    # Count and log every resolved link together
+    await AccessCounterService.record_accesses([link_data["id"] for link_data in links.values()])
+    for short_code, link_data in links.items():
+        await audit_pipeline.enqueue(
+            user_id=1,  # Anonymous user
+            action="access",
+            link_id=link_data["id"],
+            details=f"Accessed link: {short_code} (batch)",
+            ip_address=request.client.host if request else None,
+            user_agent=request.headers.get("user-agent") if request else None
+        )
     
-    # If not in cache, get from database
-    db_link = CRUDLink.get_by_short_code(db, short_code)
-    if not db_link or not db_link.is_active:
+    return BatchResolveResult(
+        links={short_code: link_data["target_url"] for short_code, link_data in links.items()},
+        not_found=[short_code for short_code in short_codes if short_code not in links]
+    )
+
+
+@router.get("/{short_code}", dependencies=[Depends(rate_limit("resolve"))])
+async def resolve_link(
+    short_code: str,
+    request: Request = None
+):
+    """Resolve a short link to its target URL"""
+    # Codes the filter has never seen are answered without any I/O
+    if not short_code_filter.might_contain(short_code):
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Link not found"
         )
     
-    # Cache the link
-    link_data = {
-        "id": db_link.id,
-        "short_code": db_link.short_code,
-        "target_url": db_link.target_url,
-        "title": db_link.title,
-        "is_active": db_link.is_active
-    }
-    CacheService.set_link(db_link.short_code, link_data)
+    # Cache first; misses are loaded once per short code across requests and workers.
+    # Clicks on active links are counted as part of the lookup.
+    link_data = await LinkResolver.resolve(short_code, record_access=True)
     
-    # Increment access count
-    CRUDLink.increment_access_count(db, db_link.id)
-    CacheService.increment_access_count(short_code)
+    # Tombstones and inactive links are answered without touching the database
+    if not link_data.get("is_active"):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Link not found"
+        )
     
     # Log the access
-    CRUDAuditLog.create(
-        db=db,
+    await audit_pipeline.enqueue(
         user_id=1,  # Anonymous user
         action="access",
-        link_id=db_link.id,
+        link_id=link_data["id"],
         details=f"Accessed link: {short_code}",
         ip_address=request.client.host if request else None,
         user_agent=request.headers.get("user-agent") if request else None
     )
     
-    return RedirectResponse(url=db_link.target_url)
+    return RedirectResponse(url=link_data["target_url"])
 
 
 @router.get("/", response_model=LinkList)
@@ -152,22 +271,47 @@ async def list_links(
     skip: int = 0,
     limit: int = 100,
     search: Optional[str] = None,
+    search_mode: str = Query("substring", pattern="^(substring|ranked)$"),
+    estimate_total: bool = False,
+    after: Optional[tuple] = Depends(get_cursor),
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
-    """List all links with optional search"""
-    links, total = CRUDLink.get_all(db, skip=skip, limit=limit, search=search)
-    return LinkList(links=links, total=total, page=skip // limit + 1, per_page=limit)
+    """List all links with optional search, paged by skip or by cursor (newest first)"""
+    ranked = bool(search) and search_mode == "ranked"
+    if ranked and after is not None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Cursor pagination is not supported for ranked search"
+        )
+    
+    links, total = await CRUDLink.get_all(
+        db,
+        skip=skip,
+        limit=limit,
+        search=search,
+        search_mode=search_mode,
+        estimate_total=estimate_total,
+        after=after
+    )
+    return LinkList(
+        links=links,
+        total=total,
+        total_is_estimate=estimate_total and total is not None,
+        page=skip // limit + 1,
+        per_page=limit,
+        next_cursor=None if ranked else next_cursor(links, limit)
+    )
 
 
 @router.get("/id/{link_id}", response_model=Link)
 async def get_link(
     link_id: int,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     """Get a specific link by ID"""
-    db_link = CRUDLink.get_by_id(db, link_id)
+    db_link = await CRUDLink.get_by_id(db, link_id)
     if not db_link:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -176,16 +320,44 @@ async def get_link(
     return db_link
 
 
+@router.get("/id/{link_id}/audit", response_model=AuditLogList)
+async def list_link_audit_logs(
+    link_id: int,
+    skip: int = 0,
+    limit: int = 100,
+    after: Optional[tuple] = Depends(get_cursor),
+    current_user: User = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """List audit log entries for a link, newest first"""
+    db_link = await CRUDLink.get_by_id(db, link_id)
+    if not db_link:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Link not found"
+        )
+    
+    # Check if user owns the link or is admin
+    if db_link.created_by != current_user.id and not current_user.is_admin:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not enough permissions"
+        )
+    
+    audit_logs = await CRUDAuditLog.get_by_link(db, link_id, skip=skip, limit=limit, after=after)
+    return AuditLogList(audit_logs=audit_logs, next_cursor=next_cursor(audit_logs, limit))
+
+
 @router.put("/{link_id}", response_model=Link)
 async def update_link(
     link_id: int,
     link_update: LinkUpdate,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_write_db),
     request: Request = None
 ):
     """Update a link"""
-    db_link = CRUDLink.get_by_id(db, link_id)
+    db_link = await CRUDLink.get_by_id(db, link_id)
     if not db_link:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -199,11 +371,12 @@ async def update_link(
             detail="Not enough permissions"
         )
     
-    # Update the link
-    updated_link = CRUDLink.update(db, link_id, link_update)
+    # Update the link; cache loads read the primary until replicas have the change
+    await ReadRouting.mark_links_written([db_link.short_code])
+    updated_link = await CRUDLink.update(db, link_id, link_update)
     
     # Log the action
-    CRUDAuditLog.create(
+    await CRUDAuditLog.create(
         db=db,
         user_id=current_user.id,
         action="update",
@@ -213,16 +386,9 @@ async def update_link(
         user_agent=request.headers.get("user-agent") if request else None
     )
     
-    # Update cache
+    # Update cache, replacing any tombstone on every worker
     if updated_link:
-        link_data = {
-            "id": updated_link.id,
-            "short_code": updated_link.short_code,
-            "target_url": updated_link.target_url,
-            "title": updated_link.title,
-            "is_active": updated_link.is_active
-        }
-        CacheService.set_link(updated_link.short_code, link_data)
+        await CacheService.set_link(updated_link.short_code, link_cache_data(updated_link), broadcast=True)
     
     return updated_link
 
@@ -231,11 +397,11 @@ async def update_link(
 async def delete_link(
     link_id: int,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_write_db),
     request: Request = None
 ):
     """Delete a link"""
-    db_link = CRUDLink.get_by_id(db, link_id)
+    db_link = await CRUDLink.get_by_id(db, link_id)
     if not db_link:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -249,14 +415,15 @@ async def delete_link(
             detail="Not enough permissions"
         )
     
-    # Delete from cache
-    CacheService.delete_link(db_link.short_code)
+    # Delete from database; cache loads read the primary until replicas have the change
+    await ReadRouting.mark_links_written([db_link.short_code])
+    success = await CRUDLink.delete(db, link_id)
     
-    # Delete from database
-    success = CRUDLink.delete(db, link_id)
+    # Delete from cache only now, so no worker can refill it from the row being deleted
+    await CacheService.delete_link(db_link.short_code)
     
     # Log the action
-    CRUDAuditLog.create(
+    await CRUDAuditLog.create(
         db=db,
         user_id=current_user.id,
         action="delete",
@@ -0,0 +1,148 @@
+import asyncio
+import logging
+from datetime import datetime, timezone
+from typing import Optional
+from sqlalchemy.exc import IntegrityError
+from app.analytics import LinkStatsService
+from app.config import settings
+from app.crud import CRUDAuditLog
+from app.database import AsyncSessionLocal
+
+logger = logging.getLogger(__name__)
+
+OVERFLOW_DROP = "drop"
+OVERFLOW_BLOCK = "block"
+
+
+class AuditLogPipeline:
+    """Buffers audit events in memory and writes them in multi-row batches"""
+    
+    def __init__(
+        self,
+        max_queue_size: int,
+        batch_size: int,
+        flush_interval_seconds: float,
+        overflow_policy: str,
+        block_timeout_seconds: float
+    ):
+        if overflow_policy not in (OVERFLOW_DROP, OVERFLOW_BLOCK):
+            raise ValueError(f"Unknown audit overflow policy: {overflow_policy}")
+        self.batch_size = batch_size
+        self.flush_interval_seconds = flush_interval_seconds
+        self.overflow_policy = overflow_policy
+        self.block_timeout_seconds = block_timeout_seconds
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue_size)
+        self._batch: list[dict] = []
+        self.enqueued = 0
+        self.dropped = 0
+        self.written = 0
+        self.failed = 0
+        self.batches = 0
+    
+    async def enqueue(
+        self,
+        user_id: int,
+        action: str,
+        link_id: Optional[int] = None,
+        details: Optional[str] = None,
+        ip_address: Optional[str] = None,
+        user_agent: Optional[str] = None
+    ) -> bool:
+        """Queue an audit event, applying the overflow policy when the buffer is full"""
+        event = {
+            "user_id": user_id,
+            "link_id": link_id,
+            "action": action,
+            "details": details,
+            "ip_address": ip_address,
+            "user_agent": user_agent,
+            # Stamp now so batching delay does not shift the recorded time
+            "created_at": datetime.now(timezone.utc),
+        }
+        try:
+            if self.overflow_policy == OVERFLOW_BLOCK:
+                await asyncio.wait_for(self._queue.put(event), self.block_timeout_seconds)
+            else:
+                self._queue.put_nowait(event)
+        except (asyncio.QueueFull, asyncio.TimeoutError):
+            self.dropped += 1
+            return False
+        self.enqueued += 1
+        return True
+    
+    async def run(self) -> None:
+        """Write batches bounded by size and time until cancelled"""
+        loop = asyncio.get_running_loop()
+        while True:
+            self._batch.append(await self._queue.get())
+            deadline = loop.time() + self.flush_interval_seconds
+            while len(self._batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    self._batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            await self._write_batch()
+    
+    async def drain(self) -> None:
+        """Write everything still buffered, used on shutdown"""
+        while not self._queue.empty() or self._batch:
+            while len(self._batch) < self.batch_size and not self._queue.empty():
+                self._batch.append(self._queue.get_nowait())
+            await self._write_batch()
+    
+    async def _write_batch(self) -> None:
+        # The batch is only cleared once handled, so a cancelled write is retried by drain()
+        batch = self._batch
+        if not batch:
+            return
+        try:
+            async with AsyncSessionLocal() as db:
+                await CRUDAuditLog.create_many(db, batch)
+            self.written += len(batch)
+            self.batches += 1
+        except IntegrityError:
+            # One bad row (e.g. a link deleted since it was clicked) must not sink the batch
+            await self._write_rows(batch)
+        except Exception:
+            self.failed += len(batch)
+            logger.error("Failed to write %d audit events", len(batch), exc_info=True)
+        # Click series are counted from the same events, one Redis round trip per batch
+        if settings.link_stats_enabled:
+            await LinkStatsService.record_events(batch)
+        self._batch = []
+    
+    async def _write_rows(self, batch: list[dict]) -> None:
+        async with AsyncSessionLocal() as db:
+            for event in batch:
+                try:
+                    await CRUDAuditLog.create_many(db, [event])
+                    self.written += 1
+                except IntegrityError:
+                    await db.rollback()
+                    self.failed += 1
+        logger.warning("Wrote audit batch row by row after an integrity error")
+    
+    def stats(self) -> dict:
+        """Counters used to size the buffer"""
+        return {
+            "queued": self._queue.qsize() + len(self._batch),
+            "max_queue_size": self._queue.maxsize,
+            "overflow_policy": self.overflow_policy,
+            "enqueued": self.enqueued,
+            "dropped": self.dropped,
+            "written": self.written,
+            "failed": self.failed,
+            "batches": self.batches,
+        }
+
+
+audit_pipeline = AuditLogPipeline(
+    max_queue_size=settings.audit_queue_max_size,
+    batch_size=settings.audit_batch_size,
+    flush_interval_seconds=settings.audit_flush_interval_seconds,
+    overflow_policy=settings.audit_overflow_policy,
+    block_timeout_seconds=settings.audit_block_timeout_seconds,
+)
@@ -0,0 +1,234 @@
+import asyncio
+import hashlib
+import logging
+import math
+from app.cache import binary_redis_client, redis_client, run_subscriber
+from app.config import settings
+from app.crud import CRUDLink
+from app.database import AsyncSessionLocal
+
+logger = logging.getLogger(__name__)
+
+FILTER_KEY = "short_code_filter:bits"
+FILTER_META_KEY = "short_code_filter:meta"
+FILTER_BUILD_LOCK_KEY = "short_code_filter:build_lock"
+FILTER_CHANNEL = "short_code_filter:additions"
+# Exists while the last full rebuild from the links table is recent enough
+FILTER_REBUILT_KEY = "short_code_filter:rebuilt"
+
+
+class ShortCodeFilter:
+    """Bloom filter over every short code, shared through Redis and mirrored in each worker"""
+    
+    def __init__(self, capacity: int, error_rate: float, enabled: bool = True):
+        self.enabled = enabled
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.num_bits = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self._bits = bytearray((self.num_bits + 7) // 8)
+        # Until the filter is loaded every code is treated as possibly present
+        self.ready = False
+        # Set when a code could not be added to the shared filter, which then has to be rebuilt
+        self.needs_rebuild = False
+        self.definite_misses = 0
+        self.possible_hits = 0
+    
+    @property
+    def geometry(self) -> str:
+        return f"{self.num_bits}:{self.num_hashes}"
+    
+    def _offsets(self, short_code: str) -> list[int]:
+        # Double hashing over a stable digest so every process agrees on the bits
+        digest = hashlib.blake2b(short_code.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "big")
+        second = int.from_bytes(digest[8:], "big") | 1
+        return [(first + i * second) % self.num_bits for i in range(self.num_hashes)]
+    
+    def _set_bits(self, bits: bytearray, short_code: str) -> None:
+        # Same bit order as Redis SETBIT: offset 0 is the high bit of byte 0
+        for offset in self._offsets(short_code):
+            bits[offset >> 3] |= 0x80 >> (offset & 7)
+    
+    def might_contain(self, short_code: str) -> bool:
+        """False only when the short code is definitely not a link"""
+        if not self.ready:
+            return True
+        for offset in self._offsets(short_code):
+            if not self._bits[offset >> 3] & (0x80 >> (offset & 7)):
+                self.definite_misses += 1
+                return False
+        self.possible_hits += 1
+        return True
+    
+    def add_local(self, short_code: str) -> None:
+        """Set a short code's bits in this worker only"""
+        self._set_bits(self._bits, short_code)
+    
+    def merge(self, data: bytes) -> None:
+        """OR a bitmap into the local copy so no locally set bit is ever lost"""
+        size = len(self._bits)
+        merged = int.from_bytes(self._bits, "big") | int.from_bytes(data[:size].ljust(size, b"\0"), "big")
+        self._bits = bytearray(merged.to_bytes(size, "big"))
+    
+    async def add(self, short_code: str) -> bool:
+        """Add a short code here, in Redis and on every other worker"""
+        if not self.enabled:
+            return False
+        self.add_local(short_code)
+        try:
+            pipe = redis_client.pipeline(transaction=False)
+            for offset in self._offsets(short_code):
+                pipe.setbit(FILTER_KEY, offset, 1)
+            pipe.publish(FILTER_CHANNEL, short_code)
+            await pipe.execute()
+            return True
+        except Exception:
+            logger.warning("Could not add %s to the shared short code filter", short_code, exc_info=True)
+            await self._lost_addition()
+            return False
+    
+    async def add_many(self, short_codes: list[str]) -> bool:
+        """Add a batch of short codes with one pipeline and one announcement"""
+        if not self.enabled or not short_codes:
+            return False
+        for short_code in short_codes:
+            self.add_local(short_code)
+        try:
+            pipe = redis_client.pipeline(transaction=False)
+            for short_code in short_codes:
+                for offset in self._offsets(short_code):
+                    pipe.setbit(FILTER_KEY, offset, 1)
+            pipe.publish(FILTER_CHANNEL, "\n".join(short_codes))
+            await pipe.execute()
+            return True
+        except Exception:
+            logger.warning("Could not add %d codes to the shared short code filter", len(short_codes), exc_info=True)
+            await self._lost_addition()
+            return False
+    
+    async def _lost_addition(self) -> None:
+        """Fail open here and force a rebuild, as other workers are missing the new bits"""
+        self.ready = False
+        self.needs_rebuild = True
+        await self._invalidate_shared()
+    
+    async def _invalidate_shared(self) -> None:
+        # Without the meta key every worker's next reload finds the filter missing and rebuilds it
+        try:
+            await redis_client.delete(FILTER_META_KEY)
+            self.needs_rebuild = False
+        except Exception:
+            pass
+    
+    async def load(self) -> bool:
+        """Merge the shared filter from Redis, returning False if it has to be built"""
+        pipe = binary_redis_client.pipeline(transaction=True)
+        pipe.get(FILTER_META_KEY)
+        pipe.get(FILTER_KEY)
+        geometry, data = await pipe.execute()
+        if geometry is None or geometry.decode() != self.geometry or data is None:
+            return False
+        self.merge(data)
+        self.ready = True
+        return True
+    
+    async def build(self) -> int:
+        """Build the shared filter from the links table, returning the number of codes"""
+        bits = bytearray(len(self._bits))
+        count = 0
+        async with AsyncSessionLocal() as db:
+            async for short_code in CRUDLink.stream_short_codes(db):
+                self._set_bits(bits, short_code)
+                count += 1
+        
+        build_key = f"{FILTER_KEY}:build"
+        current_geometry = await redis_client.get(FILTER_META_KEY)
+        pipe = binary_redis_client.pipeline(transaction=True)
+        if current_geometry is not None and current_geometry != self.geometry:
+            # Sized for a different capacity or error rate, so start over
+            pipe.delete(FILTER_KEY)
+        # OR rather than overwrite, keeping codes added while we were scanning
+        pipe.set(build_key, bytes(bits))
+        pipe.bitop("OR", FILTER_KEY, FILTER_KEY, build_key)
+        pipe.delete(build_key)
+        pipe.set(FILTER_META_KEY, self.geometry)
+        pipe.set(FILTER_REBUILT_KEY, "1", ex=settings.short_code_filter_rebuild_seconds)
+        await pipe.execute()
+        return count
+    
+    async def sync(self) -> None:
+        """Load the shared filter, building it first if it does not exist yet"""
+        if await self.load():
+            return
+        async with redis_client.lock(FILTER_BUILD_LOCK_KEY, timeout=600, blocking_timeout=600):
+            # Another worker may have built it while we waited for the lock
+            if await self.load():
+                return
+            count = await self.build()
+            logger.info("Built short code filter with %d codes", count)
+        await self.load()
+    
+    async def reconcile(self) -> None:
+        """Reload the shared filter, rebuilding it when an addition was lost, it went missing, or it is due"""
+        if self.needs_rebuild:
+            await self._invalidate_shared()
+        # Rows inserted outside the API only reach the filter through a rebuild from the table
+        if await redis_client.set(FILTER_REBUILT_KEY, "1", nx=True, ex=settings.short_code_filter_rebuild_seconds):
+            count = await self.build()
+            logger.info("Rebuilt short code filter with %d codes", count)
+        if not await self.load():
+            # Evicted or invalidated: treat every code as possibly present until rebuilt
+            self.ready = False
+            await self.sync()
+    
+    def stats(self) -> dict:
+        """Configured size, estimated false-positive rate and lookup counters"""
+        fill_ratio = int.from_bytes(self._bits, "big").bit_count() / self.num_bits
+        return {
+            "enabled": self.enabled,
+            "ready": self.ready,
+            "needs_rebuild": self.needs_rebuild,
+            "capacity": self.capacity,
+            "target_error_rate": self.error_rate,
+            "estimated_error_rate": fill_ratio ** self.num_hashes,
+            "num_bits": self.num_bits,
+            "num_hashes": self.num_hashes,
+            "size_bytes": len(self._bits),
+            "fill_ratio": fill_ratio,
+            "definite_misses": self.definite_misses,
+            "possible_hits": self.possible_hits,
+        }
+
+
+short_code_filter = ShortCodeFilter(
+    capacity=settings.short_code_filter_capacity,
+    error_rate=settings.short_code_filter_error_rate,
+    enabled=settings.short_code_filter_enabled,
+)
+
+
+def _handle_addition(message: dict) -> None:
+    """Apply short codes added on another worker (newline separated for batches)"""
+    for short_code in message["data"].split("\n"):
+        short_code_filter.add_local(short_code)
+
+
+async def _reconcile_periodically() -> None:
+    while True:
+        await asyncio.sleep(settings.short_code_filter_reconcile_seconds)
+        try:
+            await short_code_filter.reconcile()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.warning("Short code filter reconcile failed, will retry", exc_info=True)
+
+
+async def run_short_code_filter() -> None:
+    """Keep the local filter in sync with Redis until cancelled"""
+    # Reloading on every (re)subscribe picks up additions missed while disconnected
+    await asyncio.gather(
+        run_subscriber(FILTER_CHANNEL, _handle_addition, short_code_filter.sync),
+        _reconcile_periodically(),
+    )
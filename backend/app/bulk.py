@@ -0,0 +1,263 @@
+import argparse
+import asyncio
+import codecs
+import csv
+import io
+import json
+import logging
+import time
+from typing import AsyncIterator, Optional
+from pydantic import ValidationError
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.bloom import short_code_filter
+from app.cache import CacheService
+from app.config import settings
+from app.crud import CRUDAuditLog, CRUDLink, CRUDUser
+from app.database import AsyncSessionLocal, ReplicaSessionLocal
+from app.replicas import ReadRouting
+from app.schemas import LinkCreate
+
+logger = logging.getLogger(__name__)
+
+BULK_FORMATS = ("csv", "ndjson")
+EXPORT_COLUMNS = ("short_code", "target_url", "title", "description", "is_active", "access_count", "created_at")
+MEDIA_TYPES = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+# Lines one CSV record (a quoted field with line breaks) may span before it is rejected
+MAX_CSV_RECORD_LINES = 100
+
+# Only the first few bad rows are reported back; the counts cover all of them
+MAX_REPORTED_ERRORS = 100
+
+
+async def iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """Split a stream of UTF-8 bytes into lines without buffering the whole body"""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    pending = ""
+    async for chunk in chunks:
+        pending += decoder.decode(chunk)
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            yield line
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending
+
+
+def _parse_csv_record(lines: list[str]) -> Optional[list[str]]:
+    """Values of one CSV record, or None while a quoted field is still open"""
+    try:
+        return next(csv.reader(lines, strict=True))
+    except csv.Error as exc:
+        if "unexpected end of data" in str(exc):
+            return None
+    # Malformed but complete, such as text after a closing quote; parse it leniently as before
+    return next(csv.reader(lines))
+
+
+async def iter_csv_records(chunks: AsyncIterator[bytes]) -> AsyncIterator[tuple[int, object]]:
+    """Yield (row number, record) from CSV with a header row, or a ValueError for a broken record"""
+    header: Optional[list[str]] = None
+    record_lines: list[str] = []
+    row_number = 0
+    async for line in iter_lines(chunks):
+        if not record_lines and not line.strip():
+            continue
+        # Quoted fields may span lines, so keep the line breaks for the parser
+        record_lines.append(line.rstrip("\r") + "\n")
+        values = _parse_csv_record(record_lines)
+        if values is None:
+            if len(record_lines) < MAX_CSV_RECORD_LINES:
+                continue
+            # Most likely an unbalanced quote; report it and carry on from the next line
+            row_number += 1
+            yield row_number, ValueError(
+                f"Quoted field spans more than {MAX_CSV_RECORD_LINES} lines; those lines were not imported"
+            )
+            record_lines = []
+            continue
+        record_lines = []
+        if header is None:
+            header = [name.strip() for name in values]
+            continue
+        row_number += 1
+        yield row_number, {
+            name: value if value != "" else None
+            for name, value in zip(header, values)
+        }
+    if record_lines:
+        # Reported rather than dropped, so a stray quote cannot silently swallow the rest of a file
+        yield row_number + 1, ValueError(
+            f"Unterminated quoted field; {len(record_lines)} lines to the end of the file were not imported"
+        )
+
+
+async def iter_ndjson_records(chunks: AsyncIterator[bytes]) -> AsyncIterator[tuple[int, object]]:
+    """Yield (row number, record) from newline-delimited JSON"""
+    row_number = 0
+    async for line in iter_lines(chunks):
+        if not line.strip():
+            continue
+        row_number += 1
+        try:
+            yield row_number, json.loads(line)
+        except ValueError as exc:
+            yield row_number, ValueError(f"Invalid JSON: {exc}")
+
+
+def iter_records(chunks: AsyncIterator[bytes], file_format: str) -> AsyncIterator[tuple[int, object]]:
+    if file_format == "csv":
+        return iter_csv_records(chunks)
+    return iter_ndjson_records(chunks)
+
+
+class BulkLinkService:
+    """Bulk import and export of links"""
+    
+    @staticmethod
+    async def import_links(
+        db: AsyncSession,
+        records: AsyncIterator[tuple[int, object]],
+        user_id: int,
+        batch_size: Optional[int] = None,
+        ip_address: Optional[str] = None,
+        user_agent: Optional[str] = None
+    ) -> dict:
+        """Validate, conflict-check and insert links in batches, returning a summary"""
+        batch_size = batch_size or settings.bulk_import_batch_size
+        summary = {"received": 0, "created": 0, "conflicts": 0, "invalid": 0, "errors": []}
+        started = time.perf_counter()
+        
+        def reject(row_number: int, error: str, key: str) -> None:
+            summary[key] += 1
+            if len(summary["errors"]) < MAX_REPORTED_ERRORS:
+                summary["errors"].append({"row": row_number, "error": error})
+        
+        batch: dict[str, tuple[int, LinkCreate]] = {}
+        async for row_number, record in records:
+            summary["received"] += 1
+            if isinstance(record, ValueError):
+                reject(row_number, str(record), "invalid")
+                continue
+            if not isinstance(record, dict):
+                reject(row_number, "Row is not a JSON object", "invalid")
+                continue
+            try:
+                link = LinkCreate(**record)
+            except ValidationError as exc:
+                reject(row_number, "; ".join(error["msg"] for error in exc.errors()), "invalid")
+                continue
+            if link.short_code in batch:
+                reject(row_number, f"Duplicate short code in file: {link.short_code}", "conflicts")
+                continue
+            batch[link.short_code] = (row_number, link)
+            if len(batch) >= batch_size:
+                await BulkLinkService._write_batch(db, batch, user_id, reject, summary)
+                batch = {}
+        if batch:
+            await BulkLinkService._write_batch(db, batch, user_id, reject, summary)
+        
+        summary["seconds"] = round(time.perf_counter() - started, 3)
+        await CRUDAuditLog.create(
+            db=db,
+            user_id=user_id,
+            action="import",
+            details=(
+                f"Imported {summary['created']} of {summary['received']} links "
+                f"({summary['conflicts']} conflicts, {summary['invalid']} invalid)"
+            ),
+            ip_address=ip_address,
+            user_agent=user_agent
+        )
+        return summary
+    
+    @staticmethod
+    async def _write_batch(db: AsyncSession, batch: dict, user_id: int, reject, summary: dict) -> None:
+        existing = await CRUDLink.get_existing_short_codes(db, list(batch))
+        for short_code in existing:
+            reject(batch[short_code][0], f"Short code already exists: {short_code}", "conflicts")
+        
+        new_links = [link for short_code, (_, link) in batch.items() if short_code not in existing]
+        created = await CRUDLink.create_many(db, new_links, user_id)
+        summary["created"] += len(created)
+        
+        # Codes taken between the check and the insert were skipped by ON CONFLICT
+        created_codes = set(created)
+        for link in new_links:
+            if link.short_code not in created_codes:
+                reject(batch[link.short_code][0], f"Short code already exists: {link.short_code}", "conflicts")
+        
+        # New codes must pass the filter and replace any cached tombstones
+        await short_code_filter.add_many(created)
+        await ReadRouting.mark_links_written(created)
+        await CacheService.delete_links(created)
+    
+    @staticmethod
+    async def export_links(file_format: str) -> AsyncIterator[str]:
+        """Stream every link as CSV or NDJSON without loading the table into memory"""
+        # A full scan, so keep it off the primary when there is a replica
+        async with ReplicaSessionLocal() as db:
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            if file_format == "csv":
+                writer.writerow(EXPORT_COLUMNS)
+            rows = 0
+            async for row in CRUDLink.stream_export_rows(db, EXPORT_COLUMNS):
+                if file_format == "csv":
+                    writer.writerow([row[name] for name in EXPORT_COLUMNS])
+                else:
+                    buffer.write(json.dumps(dict(row), default=str) + "\n")
+                rows += 1
+                if rows % 1000 == 0:
+                    yield buffer.getvalue()
+                    buffer.seek(0)
+                    buffer.truncate()
+            yield buffer.getvalue()
+
+
+async def _read_file(path: str, chunk_size: int = 64 * 1024) -> AsyncIterator[bytes]:
+    with open(path, "rb") as handle:
+        while chunk := handle.read(chunk_size):
+            yield chunk
+
+
+async def run_import(path: str, file_format: str, username: str, batch_size: int) -> dict:
+    async with AsyncSessionLocal() as db:
+        user = await CRUDUser.get_by_username(db, username)
+        if user is None:
+            raise SystemExit(f"Unknown user: {username}")
+        return await BulkLinkService.import_links(
+            db, iter_records(_read_file(path), file_format), user.id, batch_size=batch_size
+        )
+
+
+async def run_export(path: str, file_format: str) -> None:
+    with open(path, "w", newline="") as handle:
+        async for chunk in BulkLinkService.export_links(file_format):
+            handle.write(chunk)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Bulk import or export links as CSV or NDJSON")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    import_parser = subparsers.add_parser("import", help="Load links from a file")
+    import_parser.add_argument("path")
+    import_parser.add_argument("--owner", required=True, help="Username that will own the links")
+    import_parser.add_argument("--batch-size", type=int, default=settings.bulk_import_batch_size)
+    export_parser = subparsers.add_parser("export", help="Write all links to a file")
+    export_parser.add_argument("path")
+    for subparser in (import_parser, export_parser):
+        subparser.add_argument("--format", choices=BULK_FORMATS, default=None,
+                               help="Defaults to the file extension")
+    args = parser.parse_args()
+    file_format = args.format or ("ndjson" if args.path.endswith((".ndjson", ".jsonl")) else "csv")
+    
+    if args.command == "import":
+        summary = asyncio.run(run_import(args.path, file_format, args.owner, args.batch_size))
+        print(json.dumps(summary, indent=2))
+    else:
+        asyncio.run(run_export(args.path, file_format))
+        print(f"Exported links to {args.path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,70 +1,408 @@
-import redis
-import json
-from typing import Optional
+import asyncio
+import logging
+import random
+import struct
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Awaitable, Callable, Optional
+import msgpack
+from redis import asyncio as aioredis
+from redis.asyncio.client import Pipeline
 from app.config import settings
+from app.metrics import observe_redis_command, record_cache_lookup
+
+logger = logging.getLogger(__name__)
+
+
+def _connection_pool(**kwargs) -> aioredis.BlockingConnectionPool:
+    """Bounded pool; callers wait briefly for a free connection instead of opening more"""
+    return aioredis.BlockingConnectionPool.from_url(
+        settings.redis_url,
+        max_connections=settings.redis_max_connections,
+        timeout=settings.redis_pool_timeout_seconds,
+        **kwargs
+    )
+
+
+class TimedPipeline(Pipeline):
+    """Pipeline that reports its round trip latency"""
+    
+    async def execute(self, raise_on_error: bool = True):
+        started = time.perf_counter()
+        try:
+            return await super().execute(raise_on_error)
+        finally:
+            observe_redis_command("PIPELINE", time.perf_counter() - started)
+
+
+class TimedRedis(aioredis.Redis):
+    """Redis client that reports the latency of every command and pipeline"""
+    
+    async def execute_command(self, *args, **options):
+        started = time.perf_counter()
+        try:
+            return await super().execute_command(*args, **options)
+        finally:
+            observe_redis_command(str(args[0]).upper(), time.perf_counter() - started)
+    
+    def pipeline(self, transaction: bool = True, shard_hint: Optional[str] = None) -> TimedPipeline:
+        return TimedPipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint)
+
 
 # Redis connection
-redis_client = redis.from_url(settings.redis_url, decode_responses=True)
+redis_client = TimedRedis(connection_pool=_connection_pool(decode_responses=True))
+
+# Connection for binary values such as cached links and the short code filter bitmap
+binary_redis_client = TimedRedis(connection_pool=_connection_pool())
+
+# Pub/sub channel used to invalidate local caches on every worker
+INVALIDATION_CHANNEL = "link_invalidations"
+
+# Cached in place of a link for unknown or inactive short codes
+TOMBSTONE = {"tombstone": True, "is_active": False}
+
+# Cached link values start with a fixed header (format version, active flag and
+# link id) so Lua scripts can read them, followed by the msgpack-encoded fields.
+# Values in any other format are treated as misses.
+CACHE_FORMAT_VERSION = 1
+CACHE_HEADER = struct.Struct(">BBI")
+
+# Identifies this process so it can ignore its own invalidation messages
+instance_id = uuid.uuid4().hex
+
+
+def link_cache_data(db_link) -> dict:
+    """Fields of a link needed to resolve it from the cache"""
+    return {
+        "id": db_link.id,
+        "short_code": db_link.short_code,
+        "target_url": db_link.target_url,
+        "title": db_link.title,
+        "is_active": db_link.is_active
+    }
+
+
+def encode_link(link_data: dict) -> bytes:
+    """Compact cache value for link data or a tombstone"""
+    header = CACHE_HEADER.pack(
+        CACHE_FORMAT_VERSION,
+        1 if link_data.get("is_active") else 0,
+        link_data.get("id") or 0
+    )
+    return header + msgpack.packb(link_data)
+
+
+def decode_link(value: Optional[bytes]) -> Optional[dict]:
+    """Link data from a cache value, or None if missing or in an older format"""
+    if not value or value[0] != CACHE_FORMAT_VERSION:
+        return None
+    return msgpack.unpackb(value[CACHE_HEADER.size:])
+
+
+class LocalLinkCache:
+    """Bounded in-process TTL + LRU cache in front of Redis"""
+    
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, tuple[float, dict]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+    
+    def get(self, key: str) -> Optional[dict]:
+        """Get an entry, refreshing its LRU position"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+    
+    def set(self, key: str, value: dict, ttl_seconds: Optional[float] = None) -> None:
+        """Store an entry, evicting the least recently used ones if full"""
+        if self.max_entries <= 0:
+            return
+        ttl_seconds = min(ttl_seconds, self.ttl_seconds) if ttl_seconds else self.ttl_seconds
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+    
+    def delete(self, key: str) -> None:
+        """Drop an entry"""
+        with self._lock:
+            if self._entries.pop(key, None) is not None:
+                self.invalidations += 1
+    
+    def clear(self) -> None:
+        """Drop all entries"""
+        with self._lock:
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+    
+    def stats(self) -> dict:
+        """Counters used to size the cache"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.max_entries > 0,
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
+
+
+local_link_cache = LocalLinkCache(
+    max_entries=settings.local_cache_max_entries if settings.local_cache_enabled else 0,
+    ttl_seconds=settings.local_cache_ttl_seconds,
+)
+
+
+def _handle_invalidation(message: dict) -> None:
+    """Apply an invalidation published by another worker"""
+    origin, _, short_code = message["data"].partition(":")
+    if origin == instance_id:
+        return
+    if short_code == "*":
+        local_link_cache.clear()
+    else:
+        local_link_cache.delete(short_code)
+
+
+async def _resync_local_cache() -> None:
+    # Anything published while we were disconnected was missed
+    local_link_cache.clear()
+
+
+async def run_subscriber(
+    channel: str,
+    handle_message: Callable[[dict], None],
+    on_subscribe: Callable[[], Awaitable[None]]
+) -> None:
+    """Deliver messages published on a channel until cancelled, resubscribing after errors"""
+    while True:
+        try:
+            async with redis_client.pubsub(ignore_subscribe_messages=True) as pubsub:
+                await pubsub.subscribe(channel)
+                await on_subscribe()
+                async for message in pubsub.listen():
+                    handle_message(message)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.warning("Subscriber for %s failed, retrying", channel, exc_info=True)
+            await asyncio.sleep(1.0)
+
+
+async def run_invalidation_listener() -> None:
+    """Apply invalidations published by other workers until cancelled"""
+    # Local entries still expire after local_cache_ttl_seconds while disconnected
+    await run_subscriber(INVALIDATION_CHANNEL, _handle_invalidation, _resync_local_cache)
 
 
 class CacheService:
-    """Service for Redis caching operations"""
+    """Service for async Redis caching operations"""
     
     @staticmethod
-    def get_link(short_code: str) -> Optional[dict]:
+    async def get_link(short_code: str) -> Optional[dict]:
         """Get a link from cache"""
+        link_data, _ = await CacheService.get_link_entry(short_code)
+        return link_data
+    
+    @staticmethod
+    async def get_link_entry(short_code: str) -> tuple[Optional[dict], Optional[float]]:
+        """Get a link from cache with its remaining Redis TTL (None for local hits)"""
+        local_data = local_link_cache.get(short_code)
+        record_cache_lookup("local", local_data is not None)
+        if local_data is not None:
+            return local_data, None
         try:
-            cached_data = redis_client.get(f"link:{short_code}")
-            if cached_data:
-                return json.loads(cached_data)
-            return None
+            pipe = binary_redis_client.pipeline(transaction=False)
+            pipe.get(f"link:{short_code}")
+            pipe.pttl(f"link:{short_code}")
+            cached_data, ttl_ms = await pipe.execute()
+            link_data = decode_link(cached_data)
+            record_cache_lookup("redis", link_data is not None)
+            if link_data is not None:
+                local_link_cache.set(short_code, link_data)
+                return link_data, ttl_ms / 1000 if ttl_ms and ttl_ms > 0 else None
+            return None, None
         except Exception:
-            return None
+            return None, None
     
     @staticmethod
-    def set_link(short_code: str, link_data: dict, expire_seconds: int = 3600) -> bool:
-        """Cache a link"""
+    async def get_links(short_codes: list[str]) -> dict[str, dict]:
+        """Get many links from cache, with one MGET for those not cached locally"""
+        found = {}
+        remote = []
+        for short_code in short_codes:
+            local_data = local_link_cache.get(short_code)
+            record_cache_lookup("local", local_data is not None)
+            if local_data is not None:
+                found[short_code] = local_data
+            else:
+                remote.append(short_code)
+        if not remote:
+            return found
         try:
-            redis_client.setex(
-                f"link:{short_code}",
-                expire_seconds,
-                json.dumps(link_data)
+            values = await binary_redis_client.mget([f"link:{short_code}" for short_code in remote])
+        except Exception:
+            return found
+        for short_code, cached_data in zip(remote, values):
+            link_data = decode_link(cached_data)
+            record_cache_lookup("redis", link_data is not None)
+            if link_data is not None:
+                local_link_cache.set(short_code, link_data)
+                found[short_code] = link_data
+        return found
+    
+    @staticmethod
+    async def set_link(
+        short_code: str,
+        link_data: dict,
+        expire_seconds: Optional[int] = None,
+        broadcast: bool = False
+    ) -> bool:
+        """Cache a link, replacing any tombstone, optionally invalidating other workers' local copies"""
+        local_link_cache.set(short_code, link_data)
+        if expire_seconds is None:
+            # Jitter so links cached together do not all expire together
+            jitter = settings.link_cache_ttl_jitter
+            expire_seconds = int(settings.link_cache_ttl_seconds * random.uniform(1 - jitter, 1 + jitter))
+        try:
+            pipe = binary_redis_client.pipeline(transaction=False)
+            pipe.setex(f"link:{short_code}", expire_seconds, encode_link(link_data))
+            if broadcast:
+                pipe.publish(INVALIDATION_CHANNEL, f"{instance_id}:{short_code}")
+            await pipe.execute()
+            return True
+        except Exception:
+            return False
+    
+    @staticmethod
+    async def set_links(links: list[dict]) -> bool:
+        """Cache many links with one pipelined round trip"""
+        jitter = settings.link_cache_ttl_jitter
+        pipe = binary_redis_client.pipeline(transaction=False)
+        for link_data in links:
+            local_link_cache.set(link_data["short_code"], link_data)
+            pipe.setex(
+                f"link:{link_data['short_code']}",
+                int(settings.link_cache_ttl_seconds * random.uniform(1 - jitter, 1 + jitter)),
+                encode_link(link_data)
             )
+        try:
+            await pipe.execute()
             return True
         except Exception:
             return False
     
     @staticmethod
-    def delete_link(short_code: str) -> bool:
+    async def set_tombstone(short_code: str) -> bool:
+        """Remember for a short while that a short code does not resolve"""
+        try:
+            # NX so a link created while we were querying the database is not hidden
+            stored = await binary_redis_client.set(
+                f"link:{short_code}",
+                encode_link(TOMBSTONE),
+                ex=settings.negative_cache_ttl_seconds,
+                nx=True
+            )
+        except Exception:
+            stored = True
+        if stored:
+            local_link_cache.set(short_code, TOMBSTONE, ttl_seconds=settings.negative_cache_ttl_seconds)
+        return bool(stored)
+    
+    @staticmethod
+    async def set_tombstones(short_codes: list[str]) -> None:
+        """Remember many unresolvable short codes with one pipelined round trip"""
+        if not short_codes:
+            return
+        pipe = binary_redis_client.pipeline(transaction=False)
+        for short_code in short_codes:
+            pipe.set(
+                f"link:{short_code}",
+                encode_link(TOMBSTONE),
+                ex=settings.negative_cache_ttl_seconds,
+                nx=True
+            )
+        try:
+            stored = await pipe.execute()
+        except Exception:
+            stored = [True] * len(short_codes)
+        for short_code, was_stored in zip(short_codes, stored):
+            if was_stored:
+                local_link_cache.set(short_code, TOMBSTONE, ttl_seconds=settings.negative_cache_ttl_seconds)
+    
+    @staticmethod
+    async def delete_link(short_code: str) -> bool:
         """Delete a link from cache"""
+        local_link_cache.delete(short_code)
         try:
-            redis_client.delete(f"link:{short_code}")
+            pipe = redis_client.pipeline(transaction=False)
+            pipe.delete(f"link:{short_code}")
+            pipe.publish(INVALIDATION_CHANNEL, f"{instance_id}:{short_code}")
+            await pipe.execute()
             return True
         except Exception:
             return False
     
     @staticmethod
-    def increment_access_count(short_code: str) -> Optional[int]:
-        """Increment access count for a link"""
+    async def delete_links(short_codes: list[str]) -> bool:
+        """Delete many links (or their tombstones) from cache in one round trip"""
+        for short_code in short_codes:
+            local_link_cache.delete(short_code)
+        if not short_codes:
+            return True
         try:
-            return redis_client.incr(f"access_count:{short_code}")
+            pipe = redis_client.pipeline(transaction=False)
+            pipe.delete(*[f"link:{short_code}" for short_code in short_codes])
+            for short_code in short_codes:
+                pipe.publish(INVALIDATION_CHANNEL, f"{instance_id}:{short_code}")
+            await pipe.execute()
+            return True
         except Exception:
-            return None
+            return False
     
     @staticmethod
-    def get_access_count(short_code: str) -> Optional[int]:
-        """Get access count for a link"""
+    async def broadcast_invalidation(short_code: str) -> bool:
+        """Tell every other worker to drop its local copy of a link"""
         try:
-            count = redis_client.get(f"access_count:{short_code}")
-            return int(count) if count else 0
+            await redis_client.publish(INVALIDATION_CHANNEL, f"{instance_id}:{short_code}")
+            return True
         except Exception:
-            return None
+            return False
     
     @staticmethod
-    def clear_cache() -> bool:
+    async def clear_cache() -> bool:
         """Clear all cached data"""
+        local_link_cache.clear()
         try:
-            redis_client.flushdb()
+            await redis_client.flushdb()
+            await CacheService.broadcast_invalidation("*")
             return True
         except Exception:
-            return False 
\ No newline at end of file
+            return False
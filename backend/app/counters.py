@@ -0,0 +1,136 @@
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Optional
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.cache import CACHE_FORMAT_VERSION, binary_redis_client, decode_link, local_link_cache, redis_client
+from app.config import settings
+from app.crud import CRUDLink
+from app.metrics import record_cache_lookup
+from app.writebehind import WriteBehindFlusher, run_flusher
+
+# Clicks accumulate in the pending hashes (field = link id) until a flush
+# moves them to the flushing hashes and applies them to the links table
+# (see app/writebehind.py).
+PENDING_CLICKS_KEY = "access_counter:pending:clicks"
+PENDING_LAST_ACCESSED_KEY = "access_counter:pending:last_accessed"
+FLUSHING_CLICKS_KEY = "access_counter:flushing:clicks"
+FLUSHING_LAST_ACCESSED_KEY = "access_counter:flushing:last_accessed"
+
+ACCESS_COUNT_FLUSHER = WriteBehindFlusher(
+    "access_counter",
+    pending_keys=[PENDING_CLICKS_KEY, PENDING_LAST_ACCESSED_KEY],
+    flushing_keys=[FLUSHING_CLICKS_KEY, FLUSHING_LAST_ACCESSED_KEY],
+    lock_seconds=settings.access_count_flush_lock_seconds
+)
+
+# Reads a cached link and, when it is an active link in the current format,
+# counts the click using the link id from the value header (see encode_link)
+GET_AND_COUNT_SCRIPT = binary_redis_client.register_script("""
+local value = redis.call('GET', KEYS[1])
+local ttl = redis.call('PTTL', KEYS[1])
+if value and string.byte(value, 1) == tonumber(ARGV[1]) and string.byte(value, 2) == 1 then
+    local id = 0
+    for i = 3, 6 do
+        id = id * 256 + string.byte(value, i)
+    end
+    redis.call('HINCRBY', KEYS[2], id, 1)
+    redis.call('HSET', KEYS[3], id, ARGV[2])
+end
+return {value, ttl}
+""")
+
+
+def _latest_timestamp(*values: Optional[str]) -> Optional[datetime]:
+    """Most recent of several epoch-second strings"""
+    timestamps = [float(value) for value in values if value]
+    if not timestamps:
+        return None
+    return datetime.fromtimestamp(max(timestamps), tz=timezone.utc)
+
+
+class AccessCounterService:
+    """Write-behind access counters kept in Redis and flushed to Postgres"""
+    
+    @staticmethod
+    async def record_access(link_id: int) -> bool:
+        """Record one click for a link"""
+        try:
+            pipe = redis_client.pipeline(transaction=True)
+            pipe.hincrby(PENDING_CLICKS_KEY, link_id, 1)
+            pipe.hset(PENDING_LAST_ACCESSED_KEY, link_id, datetime.now(timezone.utc).timestamp())
+            await pipe.execute()
+            return True
+        except Exception:
+            return False
+    
+    @staticmethod
+    async def get_link_and_record_access(short_code: str) -> tuple[Optional[dict], Optional[float]]:
+        """Cached link data and its Redis TTL, counting the click if it is active, in one round trip"""
+        link_data = local_link_cache.get(short_code)
+        record_cache_lookup("local", link_data is not None)
+        if link_data is not None:
+            if link_data.get("is_active"):
+                await AccessCounterService.record_access(link_data["id"])
+            return link_data, None
+        try:
+            value, ttl_ms = await GET_AND_COUNT_SCRIPT(
+                keys=[f"link:{short_code}", PENDING_CLICKS_KEY, PENDING_LAST_ACCESSED_KEY],
+                args=[CACHE_FORMAT_VERSION, datetime.now(timezone.utc).timestamp()]
+            )
+        except Exception:
+            return None, None
+        link_data = decode_link(value)
+        record_cache_lookup("redis", link_data is not None)
+        if link_data is None:
+            return None, None
+        local_link_cache.set(short_code, link_data)
+        return link_data, ttl_ms / 1000 if ttl_ms and ttl_ms > 0 else None
+    
+    @staticmethod
+    async def record_accesses(link_ids: list[int]) -> bool:
+        """Record one click per entry (repeats included) in a single round trip"""
+        if not link_ids:
+            return True
+        now = datetime.now(timezone.utc).timestamp()
+        try:
+            pipe = redis_client.pipeline(transaction=True)
+            for link_id, clicks in Counter(link_ids).items():
+                pipe.hincrby(PENDING_CLICKS_KEY, link_id, clicks)
+            pipe.hset(PENDING_LAST_ACCESSED_KEY, mapping={link_id: now for link_id in link_ids})
+            await pipe.execute()
+            return True
+        except Exception:
+            return False
+    
+    @staticmethod
+    async def get_pending(link_id: int) -> tuple[int, Optional[datetime]]:
+        """Clicks and last access for a link that are not in the database yet"""
+        try:
+            pipe = redis_client.pipeline(transaction=True)
+            pipe.hget(PENDING_CLICKS_KEY, link_id)
+            pipe.hget(FLUSHING_CLICKS_KEY, link_id)
+            pipe.hget(PENDING_LAST_ACCESSED_KEY, link_id)
+            pipe.hget(FLUSHING_LAST_ACCESSED_KEY, link_id)
+            pending, flushing, pending_at, flushing_at = await pipe.execute()
+            return int(pending or 0) + int(flushing or 0), _latest_timestamp(pending_at, flushing_at)
+        except Exception:
+            return 0, None
+    
+    @staticmethod
+    async def flush() -> int:
+        """Apply pending clicks to the links table, returning the number of links updated"""
+        return await ACCESS_COUNT_FLUSHER.run(AccessCounterService._apply)
+    
+    @staticmethod
+    async def _apply(db: AsyncSession, clicks: dict, last_accessed: dict) -> int:
+        counts = {
+            int(link_id): (int(delta), _latest_timestamp(last_accessed.get(link_id)))
+            for link_id, delta in clicks.items()
+        }
+        await CRUDLink.apply_access_counts(db, counts)
+        return len(counts)
+
+
+async def run_access_counter_flusher() -> None:
+    """Flush access counters every interval until cancelled"""
+    await run_flusher(AccessCounterService.flush, settings.access_count_flush_interval_seconds, "Access counter")
@@ -1,54 +1,166 @@
-from sqlalchemy.orm import Session
-from sqlalchemy import func
-from typing import List, Optional
-from datetime import datetime
-from app.models import User, Link, AuditLog
-from app.schemas import LinkCreate, LinkUpdate, UserCreate
-from app.auth import get_password_hash
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import DateTime, Integer, bindparam, column, delete, func, insert, literal_column, select, update, values
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.engine import Row
+from sqlalchemy.orm import joinedload
+import json
+from typing import AsyncIterator, List, Optional, Sequence
+from datetime import datetime, timedelta, timezone
+from app.models import User, Link, AuditLog, LinkClickRollup, WriteBehindFlush
+from app.schemas import LinkCreate, LinkUpdate, UserAdminUpdate, UserCreate
+from app.auth import get_password_hash_async
+from app.pagination import keyset_page
+
+# Must match the expression index created in alembic revision 0002
+LINK_SEARCH_VECTOR = literal_column(
+    "to_tsvector('english'::regconfig, "
+    "coalesce(links.title, '') || ' ' || coalesce(links.description, '') || ' ' || links.short_code)"
+)
+SEARCH_CONFIG = literal_column("'english'::regconfig")
+
+# Cache misses on the redirect path read only what a cache entry holds, as plain
+# rows. Built once so every call reuses the same compiled statement.
+_links = Link.__table__
+RESOLVE_COLUMNS = (_links.c.id, _links.c.short_code, _links.c.target_url, _links.c.title, _links.c.is_active)
+RESOLVE_LINK_QUERY = select(*RESOLVE_COLUMNS).where(_links.c.short_code == bindparam("short_code"))
+RESOLVE_LINKS_QUERY = select(*RESOLVE_COLUMNS).where(
+    _links.c.short_code.in_(bindparam("short_codes", expanding=True))
+)
 
 
 class CRUDUser:
     """CRUD operations for User model"""
     
     @staticmethod
-    def get_by_username(db: Session, username: str) -> Optional[User]:
-        return db.query(User).filter(User.username == username).first()
+    async def get_by_username(db: AsyncSession, username: str) -> Optional[User]:
+        result = await db.execute(select(User).where(User.username == username))
+        return result.scalars().first()
     
     @staticmethod
-    def get_by_email(db: Session, email: str) -> Optional[User]:
-        return db.query(User).filter(User.email == email).first()
+    async def get_by_email(db: AsyncSession, email: str) -> Optional[User]:
+        result = await db.execute(select(User).where(User.email == email))
+        return result.scalars().first()
     
     @staticmethod
-    def create(db: Session, user: UserCreate) -> User:
-        hashed_password = get_password_hash(user.password)
+    async def create(db: AsyncSession, user: UserCreate) -> User:
+        hashed_password = await get_password_hash_async(user.password)
         db_user = User(
             username=user.username,
             email=user.email,
             hashed_password=hashed_password
         )
         db.add(db_user)
-        db.commit()
-        db.refresh(db_user)
+        await db.commit()
+        await db.refresh(db_user)
+        return db_user
+    
+    @staticmethod
+    async def update(db: AsyncSession, user_id: int, user_update: UserAdminUpdate) -> Optional[User]:
+        result = await db.execute(select(User).where(User.id == user_id))
+        db_user = result.scalars().first()
+        if not db_user:
+            return None
+        
+        for field, value in user_update.dict(exclude_unset=True).items():
+            setattr(db_user, field, value)
+        
+        await db.commit()
+        await db.refresh(db_user)
         return db_user
     
     @staticmethod
-    def get_all(db: Session, skip: int = 0, limit: int = 100) -> List[User]:
-        return db.query(User).offset(skip).limit(limit).all()
+    async def get_all(db: AsyncSession, skip: int = 0, limit: int = 100) -> List[User]:
+        result = await db.execute(select(User).offset(skip).limit(limit))
+        return list(result.scalars().all())
 
 
 class CRUDLink:
     """CRUD operations for Link model"""
     
     @staticmethod
-    def get_by_short_code(db: Session, short_code: str) -> Optional[Link]:
-        return db.query(Link).filter(Link.short_code == short_code).first()
+    async def get_by_short_code(db: AsyncSession, short_code: str) -> Optional[Link]:
+        result = await db.execute(select(Link).where(Link.short_code == short_code))
+        return result.scalars().first()
     
     @staticmethod
-    def get_by_id(db: Session, link_id: int) -> Optional[Link]:
-        return db.query(Link).filter(Link.id == link_id).first()
+    async def get_for_resolve(db: AsyncSession, short_code: str) -> Optional[Row]:
+        """Cache fields of a link without loading an ORM entity"""
+        result = await db.execute(RESOLVE_LINK_QUERY, {"short_code": short_code})
+        return result.first()
+    
+    @staticmethod
+    async def get_many_for_resolve(db: AsyncSession, short_codes: Sequence[str]) -> List[Row]:
+        if not short_codes:
+            return []
+        result = await db.execute(RESOLVE_LINKS_QUERY, {"short_codes": list(short_codes)})
+        return list(result.all())
+    
+    @staticmethod
+    async def stream_short_codes(db: AsyncSession) -> AsyncIterator[str]:
+        result = await db.stream_scalars(
+            select(Link.short_code).execution_options(yield_per=10000)
+        )
+        async for short_code in result:
+            yield short_code
+    
+    @staticmethod
+    async def stream_export_rows(db: AsyncSession, columns: Sequence[str]) -> AsyncIterator[dict]:
+        """Stream link columns through a server-side cursor"""
+        table = Link.__table__
+        result = await db.stream(
+            select(*[table.c[name] for name in columns])
+            .order_by(table.c.id)
+            .execution_options(yield_per=1000)
+        )
+        async for row in result.mappings():
+            yield row
     
     @staticmethod
-    def create(db: Session, link: LinkCreate, user_id: int) -> Link:
+    async def get_existing_short_codes(db: AsyncSession, short_codes: Sequence[str]) -> set[str]:
+        """Which of the given short codes are already taken, in one query"""
+        if not short_codes:
+            return set()
+        result = await db.execute(select(Link.short_code).where(Link.short_code.in_(short_codes)))
+        return set(result.scalars().all())
+    
+    @staticmethod
+    async def create_many(db: AsyncSession, links: Sequence[LinkCreate], user_id: int) -> List[str]:
+        """Insert many links with one multi-row INSERT, returning the short codes created"""
+        if not links:
+            return []
+        # Codes taken since the conflict check are skipped rather than failing the batch
+        result = await db.execute(
+            pg_insert(Link.__table__)
+            .values([
+                {
+                    "short_code": link.short_code,
+                    "target_url": link.target_url,
+                    "title": link.title,
+                    "description": link.description,
+                    "created_by": user_id,
+                }
+                for link in links
+            ])
+            .on_conflict_do_nothing(index_elements=["short_code"])
+            .returning(Link.__table__.c.short_code)
+        )
+        created = list(result.scalars().all())
+        await db.commit()
+        return created
+    
+    @staticmethod
+    async def get_by_id(db: AsyncSession, link_id: int) -> Optional[Link]:
+        # Owner is serialized with the link and cannot be lazy-loaded under asyncio
+        result = await db.execute(
+            select(Link)
+            .options(joinedload(Link.owner))
+            .where(Link.id == link_id)
+            .execution_options(populate_existing=True)
+        )
+        return result.scalars().first()
+    
+    @staticmethod
+    async def create(db: AsyncSession, link: LinkCreate, user_id: int) -> Link:
         db_link = Link(
             short_code=link.short_code,
             target_url=link.target_url,
@@ -57,13 +169,13 @@ class CRUDLink:
             created_by=user_id
         )
         db.add(db_link)
-        db.commit()
-        db.refresh(db_link)
-        return db_link
+        await db.commit()
+        return await CRUDLink.get_by_id(db, db_link.id)
     
     @staticmethod
-    def update(db: Session, link_id: int, link_update: LinkUpdate) -> Optional[Link]:
-        db_link = db.query(Link).filter(Link.id == link_id).first()
+    async def update(db: AsyncSession, link_id: int, link_update: LinkUpdate) -> Optional[Link]:
+        result = await db.execute(select(Link).where(Link.id == link_id))
+        db_link = result.scalars().first()
         if not db_link:
             return None
         
@@ -72,55 +184,122 @@ class CRUDLink:
             setattr(db_link, field, value)
         
         db_link.updated_at = datetime.utcnow()
-        db.commit()
-        db.refresh(db_link)
-        return db_link
+        await db.commit()
+        return await CRUDLink.get_by_id(db, link_id)
     
     @staticmethod
-    def delete(db: Session, link_id: int) -> bool:
-        db_link = db.query(Link).filter(Link.id == link_id).first()
+    async def delete(db: AsyncSession, link_id: int) -> bool:
+        result = await db.execute(select(Link).where(Link.id == link_id))
+        db_link = result.scalars().first()
         if not db_link:
             return False
         
-        db.delete(db_link)
-        db.commit()
+        await db.delete(db_link)
+        await db.commit()
         return True
     
     @staticmethod
-    def get_all(db: Session, skip: int = 0, limit: int = 100, search: Optional[str] = None) -> tuple[List[Link], int]:
-        query = db.query(Link)
+    async def get_most_accessed(db: AsyncSession, limit: int = 1000) -> List[Link]:
+        result = await db.execute(
+            select(Link)
+            .where(Link.is_active.is_(True))
+            .order_by(Link.access_count.desc().nulls_last())
+            .limit(limit)
+        )
+        return list(result.scalars().all())
+    
+    @staticmethod
+    async def get_all(
+        db: AsyncSession,
+        skip: int = 0,
+        limit: int = 100,
+        search: Optional[str] = None,
+        search_mode: str = "substring",
+        estimate_total: bool = False,
+        after: Optional[tuple[datetime, int]] = None
+    ) -> tuple[List[Link], Optional[int]]:
+        query = select(Link)
         
-        if search:
+        if search and search_mode == "ranked":
+            ts_query = func.websearch_to_tsquery(SEARCH_CONFIG, search)
+            query = query.where(LINK_SEARCH_VECTOR.op("@@")(ts_query)).order_by(
+                func.ts_rank(LINK_SEARCH_VECTOR, ts_query).desc(),
+                Link.id
+            )
+        elif search:
             search_term = f"%{search}%"
-            query = query.filter(
+            query = query.where(
                 (Link.title.ilike(search_term)) |
                 (Link.description.ilike(search_term)) |
                 (Link.short_code.ilike(search_term))
             )
         
-        total = query.count()
-        links = query.offset(skip).limit(limit).all()
-        return links, total
+        if after is not None:
+            # Cursor pages seek straight to the next row and skip the count entirely
+            total = None
+            query = keyset_page(query, Link, after, limit)
+        else:
+            if estimate_total:
+                total = await CRUDLink.estimate_count(db, query)
+            else:
+                total = await db.scalar(select(func.count()).select_from(query.order_by(None).subquery()))
+            if search_mode != "ranked" or not search:
+                query = keyset_page(query, Link, None, limit)
+            query = query.offset(skip).limit(limit)
+        
+        result = await db.execute(query.options(joinedload(Link.owner)))
+        return list(result.scalars().all()), total
     
     @staticmethod
-    def increment_access_count(db: Session, link_id: int) -> Optional[Link]:
-        db_link = db.query(Link).filter(Link.id == link_id).first()
-        if not db_link:
-            return None
+    async def estimate_count(db: AsyncSession, query) -> int:
+        """Planner row estimate for a query, far cheaper than COUNT(*) on a large table"""
+        # Search terms stay bound parameters, passed in the order the statement numbers them
+        compiled = query.order_by(None).compile(
+            dialect=db.get_bind().dialect,
+            compile_kwargs={"render_postcompile": True}
+        )
+        params = tuple(compiled.params[name] for name in compiled.positiontup)
+        connection = await db.connection()
+        result = await connection.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {compiled}", params)
+        plan = result.scalar()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]["Plan"]["Plan Rows"])
+    
+    # Links per UPDATE, keeping bind parameters (three per link) under the driver's limit
+    ACCESS_COUNT_CHUNK_SIZE = 5000
+    
+    @staticmethod
+    async def apply_access_counts(db: AsyncSession, counts: dict[int, tuple[int, Optional[datetime]]]) -> None:
+        """Add click deltas and last-access times to many links in the caller's transaction"""
+        rows = [(link_id, delta, last_accessed) for link_id, (delta, last_accessed) in counts.items()]
+        if not rows:
+            return
         
-        db_link.access_count += 1
-        db_link.last_accessed = datetime.utcnow()
-        db.commit()
-        db.refresh(db_link)
-        return db_link
+        for start in range(0, len(rows), CRUDLink.ACCESS_COUNT_CHUNK_SIZE):
+            pending = values(
+                column("id", Integer),
+                column("delta", Integer),
+                column("last_accessed", DateTime(timezone=True)),
+                name="pending"
+            ).data(rows[start:start + CRUDLink.ACCESS_COUNT_CHUNK_SIZE])
+            await db.execute(
+                update(Link)
+                .where(Link.id == pending.c.id)
+                .values(
+                    access_count=func.coalesce(Link.access_count, 0) + pending.c.delta,
+                    last_accessed=func.greatest(Link.last_accessed, pending.c.last_accessed)
+                )
+                .execution_options(synchronize_session=False)
+            )
 
 
 class CRUDAuditLog:
     """CRUD operations for AuditLog model"""
     
     @staticmethod
-    def create(
-        db: Session,
+    async def create(
+        db: AsyncSession,
         user_id: int,
         action: str,
         link_id: Optional[int] = None,
@@ -137,18 +316,114 @@ class CRUDAuditLog:
             user_agent=user_agent
         )
         db.add(db_audit_log)
-        db.commit()
-        db.refresh(db_audit_log)
+        await db.commit()
+        await db.refresh(db_audit_log)
         return db_audit_log
     
     @staticmethod
-    def get_by_link(db: Session, link_id: int, skip: int = 0, limit: int = 100) -> List[AuditLog]:
-        return db.query(AuditLog).filter(
-            AuditLog.link_id == link_id
-        ).order_by(AuditLog.created_at.desc()).offset(skip).limit(limit).all()
+    async def create_many(db: AsyncSession, events: List[dict]) -> None:
+        """Insert many audit events with a single multi-row INSERT"""
+        if not events:
+            return
+        await db.execute(insert(AuditLog.__table__).values(events))
+        await db.commit()
+    
+    @staticmethod
+    async def get_by_link(
+        db: AsyncSession,
+        link_id: int,
+        skip: int = 0,
+        limit: int = 100,
+        after: Optional[tuple[datetime, int]] = None
+    ) -> List[AuditLog]:
+        query = select(AuditLog).where(AuditLog.link_id == link_id)
+        return await CRUDAuditLog._get_page(db, query, skip, limit, after)
+    
+    @staticmethod
+    async def get_by_user(
+        db: AsyncSession,
+        user_id: int,
+        skip: int = 0,
+        limit: int = 100,
+        after: Optional[tuple[datetime, int]] = None
+    ) -> List[AuditLog]:
+        query = select(AuditLog).where(AuditLog.user_id == user_id)
+        return await CRUDAuditLog._get_page(db, query, skip, limit, after)
+    
+    @staticmethod
+    async def _get_page(db: AsyncSession, query, skip: int, limit: int, after) -> List[AuditLog]:
+        query = keyset_page(query, AuditLog, after, limit)
+        if after is None:
+            query = query.offset(skip)
+        result = await db.execute(
+            query.options(
+                joinedload(AuditLog.user),
+                joinedload(AuditLog.link).joinedload(Link.owner)
+            )
+        )
+        return list(result.scalars().all())
+
+
+class CRUDLinkClickRollup:
+    """CRUD operations for LinkClickRollup model"""
+    
+    # Rows per INSERT, keeping bind parameters under the driver's limit
+    UPSERT_CHUNK_SIZE = 5000
+    
+    @staticmethod
+    async def apply(db: AsyncSession, rows: List[dict]) -> None:
+        """Add click deltas to their buckets in the caller's transaction, keeping the highest unique visitor estimate"""
+        for start in range(0, len(rows), CRUDLinkClickRollup.UPSERT_CHUNK_SIZE):
+            statement = pg_insert(LinkClickRollup).values(rows[start:start + CRUDLinkClickRollup.UPSERT_CHUNK_SIZE])
+            await db.execute(statement.on_conflict_do_update(
+                index_elements=["link_id", "granularity", "bucket_start"],
+                set_={
+                    "clicks": LinkClickRollup.clicks + statement.excluded.clicks,
+                    "unique_visitors": func.greatest(LinkClickRollup.unique_visitors, statement.excluded.unique_visitors),
+                }
+            ))
     
     @staticmethod
-    def get_by_user(db: Session, user_id: int, skip: int = 0, limit: int = 100) -> List[AuditLog]:
-        return db.query(AuditLog).filter(
-            AuditLog.user_id == user_id
-        ).order_by(AuditLog.created_at.desc()).offset(skip).limit(limit).all() 
\ No newline at end of file
+    async def get_series(
+        db: AsyncSession,
+        link_id: int,
+        granularity: str,
+        start: datetime,
+        end: datetime
+    ) -> List[LinkClickRollup]:
+        """Buckets starting in [start, end), oldest first; one row per bucket"""
+        result = await db.execute(
+            select(LinkClickRollup)
+            .where(
+                LinkClickRollup.link_id == link_id,
+                LinkClickRollup.granularity == granularity,
+                LinkClickRollup.bucket_start >= start,
+                LinkClickRollup.bucket_start < end
+            )
+            .order_by(LinkClickRollup.bucket_start)
+        )
+        return list(result.scalars().all())
+
+
+class CRUDWriteBehindFlush:
+    """CRUD operations for WriteBehindFlush model"""
+    
+    # Applied flush ids are kept this long; a flush retried later than this is applied again
+    RETENTION = timedelta(days=7)
+    
+    @staticmethod
+    async def claim(db: AsyncSession, name: str, flush_id: str) -> bool:
+        """Record a flush in the caller's transaction, False if it was already applied"""
+        claimed = await db.scalar(
+            pg_insert(WriteBehindFlush)
+            .values(flush_id=flush_id, name=name)
+            .on_conflict_do_nothing(index_elements=["flush_id"])
+            .returning(WriteBehindFlush.flush_id)
+        )
+        if claimed is None:
+            return False
+        await db.execute(
+            delete(WriteBehindFlush)
+            .where(WriteBehindFlush.applied_at < datetime.now(timezone.utc) - CRUDWriteBehindFlush.RETENTION)
+        )
+        return True
@@ -1,4 +1,7 @@
+import itertools
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from app.config import settings
@@ -6,6 +9,8 @@ from app.config import settings
 # Create database engine
 engine = create_engine(
     settings.database_url,
+    pool_size=settings.database_pool_size,
+    max_overflow=settings.database_max_overflow,
     pool_pre_ping=True,
     pool_recycle=300,
 )
@@ -13,6 +18,64 @@ engine = create_engine(
 # Create session factory
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+
+def to_async_url(database_url: str) -> str:
+    """Same database through the asyncpg driver"""
+    url = make_url(database_url)
+    if url.drivername in ("postgresql", "postgresql+psycopg2"):
+        url = url.set(drivername="postgresql+asyncpg")
+    return url.render_as_string(hide_password=False)
+
+
+def get_async_database_url() -> str:
+    """Async driver URL, derived from database_url unless set explicitly"""
+    return settings.async_database_url or to_async_url(settings.database_url)
+
+
+# Create async database engine used by the API routers
+async_engine = create_async_engine(
+    get_async_database_url(),
+    pool_size=settings.database_pool_size,
+    max_overflow=settings.database_max_overflow,
+    pool_pre_ping=True,
+    pool_recycle=300,
+)
+
+# Create async session factory
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine,
+    class_=AsyncSession,
+    autoflush=False,
+    expire_on_commit=False,
+)
+
+# Read replicas, each with its own pool; reads that can tolerate replication lag go here
+replica_engines = [
+    create_async_engine(
+        to_async_url(url),
+        pool_size=settings.database_replica_pool_size,
+        max_overflow=settings.database_replica_max_overflow,
+        pool_pre_ping=True,
+        pool_recycle=300,
+    )
+    for url in settings.database_replica_urls
+]
+
+_replica_sessions = itertools.cycle([
+    async_sessionmaker(
+        bind=replica_engine,
+        class_=AsyncSession,
+        autoflush=False,
+        expire_on_commit=False,
+    )
+    for replica_engine in replica_engines
+] or [AsyncSessionLocal])
+
+
+def ReplicaSessionLocal() -> AsyncSession:
+    """Session on the next read replica in turn, or on the primary when none are configured"""
+    return next(_replica_sessions)()
+
 # Create base class for models
 Base = declarative_base()
 
@@ -23,4 +86,10 @@ def get_db():
     try:
         yield db
     finally:
-        db.close() 
\ No newline at end of file
+        db.close()
+
+
+async def get_async_db():
+    """Dependency to get async database session"""
+    async with AsyncSessionLocal() as db:
+        yield db
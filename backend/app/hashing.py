@@ -0,0 +1,82 @@
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional, TypeVar
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class PasswordPoolBusy(Exception):
+    """Raised when the password hashing pool cannot take more work"""
+
+
+class PasswordHashPool:
+    """Bounded thread pool that keeps bcrypt off the event loop"""
+
+    def __init__(self, max_workers: int, max_waiting: int, queue_timeout_seconds: float):
+        self.max_workers = max_workers
+        self.max_waiting = max_waiting
+        self.queue_timeout_seconds = queue_timeout_seconds
+        self._slots = asyncio.Semaphore(max_workers)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self.waiting = 0
+        self.running = 0
+        self.completed = 0
+        self.rejected = 0
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        # Created on first use so forked workers do not inherit threads
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers, thread_name_prefix="password-hash"
+            )
+        return self._executor
+
+    async def run(self, func: Callable[..., T], *args) -> T:
+        """Run a hashing call in the pool, failing fast when it is saturated"""
+        if self._slots.locked() and self.waiting >= self.max_waiting:
+            self.rejected += 1
+            raise PasswordPoolBusy()
+
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._slots.acquire(), timeout=self.queue_timeout_seconds)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise PasswordPoolBusy()
+        finally:
+            self.waiting -= 1
+
+        self.running += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_executor(), func, *args)
+        finally:
+            self.running -= 1
+            self.completed += 1
+            self._slots.release()
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self) -> dict:
+        return {
+            "max_workers": self.max_workers,
+            "max_waiting": self.max_waiting,
+            "running": self.running,
+            "waiting": self.waiting,
+            "completed": self.completed,
+            "rejected": self.rejected,
+        }
+
+
+password_pool = PasswordHashPool(
+    max_workers=settings.password_hash_workers,
+    max_waiting=settings.password_hash_max_waiting,
+    queue_timeout_seconds=settings.password_hash_queue_timeout_seconds,
+)
@@ -0,0 +1,106 @@
+import atexit
+import json
+import logging
+import queue
+import random
+import sys
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+from app.config import settings
+
+# Request lines are written by this logger so they can be routed or silenced separately
+access_logger = logging.getLogger("app.access")
+
+_listener: Optional[QueueListener] = None
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, including any access fields attached to the record"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        entry.update(getattr(record, "access", {}))
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """Hands records to the listener thread, dropping them rather than waiting when it falls behind"""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Formatting happens on the listener thread; tracebacks are rendered now
+        # because the frames they point at may change before the listener runs
+        if record.exc_info:
+            return super().prepare(record)
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def configure_logging() -> None:
+    """Set up text logging, or JSON logging queued for a background writer thread"""
+    if settings.log_format != "json":
+        logging.basicConfig(level=logging.INFO)
+        return
+    root = logging.getLogger()
+    root.handlers = [NonBlockingQueueHandler(queue.Queue(maxsize=settings.log_queue_max_size))]
+    root.setLevel(logging.INFO)
+
+
+def _queue_handler() -> Optional[NonBlockingQueueHandler]:
+    return next((h for h in logging.getLogger().handlers if isinstance(h, NonBlockingQueueHandler)), None)
+
+
+def start_logging() -> None:
+    """Start the writer thread, from the lifespan so a preloading server forks before it exists"""
+    global _listener
+    handler = _queue_handler()
+    if handler is None or _listener is not None:
+        return
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(JsonFormatter())
+    # Records logged before this point, e.g. during import, were queued and are written now
+    _listener = QueueListener(handler.queue, output, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+
+
+def stop_logging() -> None:
+    """Write out queued records and stop the listener thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def should_log_access(status_code: int, seconds: float) -> bool:
+    """Errors and slow requests are always logged, everything else is sampled"""
+    if status_code >= 400 or seconds * 1000 >= settings.access_log_slow_ms:
+        return True
+    rate = settings.access_log_sample_rate
+    return rate >= 1.0 or random.random() < rate
+
+
+def log_stats() -> dict:
+    handler = _queue_handler()
+    return {
+        "format": settings.log_format,
+        "access_sample_rate": settings.access_log_sample_rate,
+        "queued": handler.queue.qsize() if handler else 0,
+        "dropped": handler.dropped if handler else 0,
+    }
@@ -1,22 +1,88 @@
-from fastapi import FastAPI, Request
+# First, so the startup timer covers every import below
+from app.startup import mark_startup, startup_status
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
-from slowapi import Limiter, _rate_limit_exceeded_handler
-from slowapi.util import get_remote_address
-from slowapi.errors import RateLimitExceeded
+import asyncio
 import time
 import logging
+from contextlib import asynccontextmanager, suppress
 from app.config import settings
-from app.database import engine
-from app.models import Base
+from app.analytics import LinkStatsService, run_link_stats_flusher
+from app.audit import audit_pipeline
+from app.bloom import run_short_code_filter, short_code_filter
+from app.cache import binary_redis_client, local_link_cache, redis_client, run_invalidation_listener
+from app.counters import AccessCounterService, run_access_counter_flusher
+from app.database import async_engine, replica_engines
+from app.hashing import PasswordPoolBusy, password_pool
+from app.logging_config import access_logger, configure_logging, log_stats, should_log_access, start_logging
+from app.metrics import RequestMetricsMiddleware, observe_startup, render_metrics
+from app.querycount import query_totals
+from app.ratelimit import rate_limit_stats
+from app.replicas import read_routing_stats
+from app.retention import run_audit_maintenance
+from app.user_cache import local_user_cache, run_user_invalidation_listener
+from app.warmup import run_warmup, warmup_status
 from app.api import auth, links
 
 # Configure logging
-logging.basicConfig(level=logging.INFO)
+configure_logging()
 logger = logging.getLogger(__name__)
 
-# Create database tables
-Base.metadata.create_all(bind=engine)
+# The schema is managed by Alembic (alembic upgrade head, or python -m app.server
+# in production). Nothing here may touch the database or Redis at import time:
+# a preloading server imports this module once and forks its workers afterwards.
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start and stop background services"""
+    start_logging()
+    background_tasks = [
+        asyncio.create_task(run_access_counter_flusher()),
+        asyncio.create_task(audit_pipeline.run()),
+    ]
+    if settings.local_cache_enabled:
+        background_tasks.append(asyncio.create_task(run_invalidation_listener()))
+    if settings.short_code_filter_enabled:
+        background_tasks.append(asyncio.create_task(run_short_code_filter()))
+    if settings.user_cache_enabled:
+        background_tasks.append(asyncio.create_task(run_user_invalidation_listener()))
+    if settings.link_stats_enabled:
+        background_tasks.append(asyncio.create_task(run_link_stats_flusher()))
+    if settings.audit_maintenance_enabled:
+        background_tasks.append(asyncio.create_task(run_audit_maintenance()))
+    if settings.cache_warmup_enabled:
+        background_tasks.append(asyncio.create_task(run_warmup()))
+    else:
+        warmup_status["done"] = True
+    observe_startup("ready", mark_startup("ready"))
+    yield
+    for task in background_tasks:
+        task.cancel()
+        with suppress(asyncio.CancelledError):
+            await task
+    
+    await audit_pipeline.drain()
+    
+    # Do not leave clicks behind in Redis longer than necessary
+    try:
+        await AccessCounterService.flush()
+    except Exception:
+        logger.warning("Final access counter flush failed", exc_info=True)
+    if settings.link_stats_enabled:
+        try:
+            await LinkStatsService.flush()
+        except Exception:
+            logger.warning("Final click series flush failed", exc_info=True)
+    password_pool.shutdown()
+    await redis_client.close()
+    await binary_redis_client.close()
+    await async_engine.dispose()
+    for replica_engine in replica_engines:
+        await replica_engine.dispose()
+
 
 # Create FastAPI app
 app = FastAPI(
@@ -24,13 +90,19 @@ app = FastAPI(
     description="A production-ready internal go-links system",
     version="1.0.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    lifespan=lifespan
 )
 
-# Rate limiting
-limiter = Limiter(key_func=get_remote_address)
-app.state.limiter = limiter
-app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
+
+@app.exception_handler(PasswordPoolBusy)
+async def password_pool_busy_handler(request: Request, exc: PasswordPoolBusy):
+    """Shed login and registration bursts instead of queueing them"""
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Authentication is busy, please retry"},
+        headers={"Retry-After": "1"},
+    )
 
 # CORS middleware
 app.add_middleware(
@@ -50,19 +122,34 @@ app.add_middleware(
 # Request logging middleware
 @app.middleware("http")
 async def log_requests(request: Request, call_next):
-    start_time = time.time()
+    start_time = time.perf_counter()
     response = await call_next(request)
-    process_time = time.time() - start_time
+    process_time = time.perf_counter() - start_time
     
-    logger.info(
-        f"{request.method} {request.url.path} - "
-        f"Status: {response.status_code} - "
-        f"Time: {process_time:.4f}s"
-    )
+    # Sampled before anything is formatted, so skipped requests cost almost nothing
+    if should_log_access(response.status_code, process_time):
+        access_logger.info(
+            "%s %s - Status: %s - Time: %.4fs",
+            request.method,
+            request.url.path,
+            response.status_code,
+            process_time,
+            extra={"access": {
+                "method": request.method,
+                "path": request.url.path,
+                "status": response.status_code,
+                "duration_ms": round(process_time * 1000, 2),
+                "client": request.client.host if request.client else None,
+            }}
+        )
     
     return response
 
 
+# Request and query metrics middleware, outermost so it times everything else
+app.add_middleware(RequestMetricsMiddleware)
+
+
 # Include routers
 app.include_router(auth.router)
 app.include_router(links.router)
@@ -79,9 +166,19 @@ async def root():
 
 
 @app.get("/health")
-async def health_check():
-    """Health check endpoint"""
-    return {"status": "healthy", "timestamp": time.time()}
+async def health_check(response: Response):
+    """Health check endpoint, not ready until the cache warm-up finishes"""
+    if not warmup_status["done"]:
+        response.status_code = 503
+        return {"status": "warming", "timestamp": time.time()}
+    return {"status": "healthy", "timestamp": time.time(), "warmup": warmup_status}
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus metrics, aggregated across workers in multi-process mode"""
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
 
 
 @app.get("/info")
@@ -90,5 +187,18 @@ async def info():
     return {
         "environment": settings.environment,
         "debug": settings.debug,
-        "rate_limit_per_minute": settings.rate_limit_per_minute
-    } 
\ No newline at end of file
+        "rate_limit": rate_limit_stats(),
+        "local_cache": local_link_cache.stats(),
+        "audit_pipeline": audit_pipeline.stats(),
+        "short_code_filter": short_code_filter.stats(),
+        "queries": query_totals,
+        "read_routing": read_routing_stats(),
+        "user_cache": local_user_cache.stats(),
+        "password_pool": password_pool.stats(),
+        "logging": log_stats(),
+        "startup": startup_status
+    } 
+
+
+# End of the import measured by the startup timer
+observe_startup("imported", mark_startup("imported"))
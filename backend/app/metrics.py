@@ -0,0 +1,211 @@
+import logging
+import os
+import time
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    REGISTRY,
+    generate_latest,
+    multiprocess,
+)
+from sqlalchemy import event
+from starlette.datastructures import MutableHeaders
+from starlette.routing import Match
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from app.config import settings
+from app.database import async_engine, engine, replica_engines
+from app.querycount import record_request, track_queries
+from app.startup import mark_startup, startup_status
+
+logger = logging.getLogger(__name__)
+
+# With PROMETHEUS_MULTIPROC_DIR set, every worker writes its samples to files
+# in that directory and /metrics aggregates them, whichever worker serves it.
+MULTIPROCESS = "PROMETHEUS_MULTIPROC_DIR" in os.environ
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds",
+    "Request latency by route template",
+    ["method", "route"],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+)
+HTTP_RESPONSES = Counter(
+    "http_responses_total",
+    "Responses by route template and status code",
+    ["method", "route", "status"],
+)
+LINK_CACHE_LOOKUPS = Counter(
+    "link_cache_lookups_total",
+    "Link cache lookups by layer (local, redis) and result (hit, miss)",
+    ["layer", "result"],
+)
+REDIS_COMMAND_SECONDS = Histogram(
+    "redis_command_duration_seconds",
+    "Redis round trip latency by command (PIPELINE for pipelines)",
+    ["command"],
+    buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5),
+)
+DB_POOL_CHECKOUT_SECONDS = Histogram(
+    "db_pool_checkout_duration_seconds",
+    "Time spent waiting for a database connection from the pool",
+    ["engine"],
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0),
+)
+DB_POOL_CHECKOUTS = Counter(
+    "db_pool_checkouts_total",
+    "Database connections handed out by the pool",
+    ["engine"],
+)
+DB_POOL_CHECKED_OUT = Gauge(
+    "db_pool_checked_out",
+    "Database connections currently in use",
+    ["engine"],
+    multiprocess_mode="livesum",
+)
+DB_POOL_OVERFLOW = Gauge(
+    "db_pool_overflow",
+    "Connections open beyond the pool size (negative while below it)",
+    ["engine"],
+    multiprocess_mode="livesum",
+)
+HTTP_REQUEST_DB_QUERIES = Histogram(
+    "http_request_db_queries",
+    "SQL statements run per request by route template",
+    ["method", "route"],
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100),
+)
+HTTP_REQUEST_DB_SECONDS = Histogram(
+    "http_request_db_duration_seconds",
+    "Database time spent per request by route template",
+    ["method", "route"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5),
+)
+N_PLUS_ONE_WARNINGS = Counter(
+    "db_n_plus_one_warnings_total",
+    "Requests that repeated a statement N_PLUS_ONE_THRESHOLD times, by route template",
+    ["method", "route"],
+)
+STARTUP_SECONDS = Gauge(
+    "app_startup_seconds",
+    "Seconds from the start of the app import to each startup phase (imported, ready, first_request)",
+    ["phase"],
+    multiprocess_mode="max",
+)
+
+
+def route_template(scope: Scope) -> str:
+    """Route path such as /links/{short_code}, keeping label cardinality bounded"""
+    for route in scope["app"].router.routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return getattr(route, "path", "unmatched")
+    return "unmatched"
+
+
+def observe_request(method: str, route: str, status_code: int, seconds: float) -> None:
+    HTTP_REQUEST_SECONDS.labels(method, route).observe(seconds)
+    HTTP_RESPONSES.labels(method, route, str(status_code)).inc()
+
+
+def observe_request_queries(method: str, route: str, queries: int, seconds: float, n_plus_one: bool) -> None:
+    HTTP_REQUEST_DB_QUERIES.labels(method, route).observe(queries)
+    HTTP_REQUEST_DB_SECONDS.labels(method, route).observe(seconds)
+    if n_plus_one:
+        N_PLUS_ONE_WARNINGS.labels(method, route).inc()
+
+
+class RequestMetricsMiddleware:
+    """Latency, status and SQL query metrics per route template, as plain ASGI middleware"""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start_time = time.perf_counter()
+        status_code = 500
+
+        with track_queries() as stats:
+            async def send_with_query_headers(message: Message) -> None:
+                nonlocal status_code
+                if message["type"] == "http.response.start":
+                    status_code = message["status"]
+                    if settings.query_count_headers_enabled:
+                        headers = MutableHeaders(scope=message)
+                        headers["X-DB-Query-Count"] = str(stats.count)
+                        headers["X-DB-Time-Ms"] = f"{stats.seconds * 1000:.2f}"
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_with_query_headers)
+            finally:
+                # Matched once, after routing, for both sets of metrics
+                route = route_template(scope)
+                observe_request(scope["method"], route, status_code, time.perf_counter() - start_time)
+                n_plus_one = record_request(scope["path"], stats)
+                observe_request_queries(scope["method"], route, stats.count, stats.seconds, n_plus_one)
+                if startup_status["first_request"] is None:
+                    observe_startup("first_request", mark_startup("first_request"))
+                    logger.info(f"First request served {startup_status['first_request']}s after import started: {startup_status}")
+
+
+def record_cache_lookup(layer: str, hit: bool) -> None:
+    LINK_CACHE_LOOKUPS.labels(layer, "hit" if hit else "miss").inc()
+
+
+def observe_redis_command(command: str, seconds: float) -> None:
+    REDIS_COMMAND_SECONDS.labels(command).observe(seconds)
+
+
+def observe_startup(phase: str, seconds: float) -> None:
+    STARTUP_SECONDS.labels(phase).set(seconds)
+
+
+def render_metrics() -> tuple[bytes, str]:
+    """Exposition body and content type for /metrics"""
+    if MULTIPROCESS:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def _instrument_pool(name: str, pool) -> None:
+    connect = pool.connect
+
+    def timed_connect():
+        started = time.perf_counter()
+        try:
+            return connect()
+        finally:
+            DB_POOL_CHECKOUT_SECONDS.labels(name).observe(time.perf_counter() - started)
+
+    # Covers waiting for a free connection as well as opening a new one
+    pool.connect = timed_connect
+
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        DB_POOL_CHECKOUTS.labels(name).inc()
+        DB_POOL_CHECKED_OUT.labels(name).inc()
+        if hasattr(pool, "overflow"):
+            DB_POOL_OVERFLOW.labels(name).set(pool.overflow())
+
+    def on_checkin(dbapi_connection, connection_record):
+        DB_POOL_CHECKED_OUT.labels(name).dec()
+        if hasattr(pool, "overflow"):
+            DB_POOL_OVERFLOW.labels(name).set(pool.overflow())
+
+    event.listen(pool, "checkout", on_checkout)
+    event.listen(pool, "checkin", on_checkin)
+
+
+_instrument_pool("sync", engine.pool)
+_instrument_pool("async", async_engine.sync_engine.pool)
+for index, replica_engine in enumerate(replica_engines):
+    _instrument_pool(f"replica{index}", replica_engine.sync_engine.pool)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Text, Boolean, ForeignKey
+from sqlalchemy import Column, Integer, BigInteger, String, Date, DateTime, Text, Boolean, ForeignKey
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.database import Base
@@ -42,6 +42,7 @@ class Link(Base):
 
 
 class AuditLog(Base):
+    # Range partitioned by month on created_at (migration 0004, app/retention.py)
     __tablename__ = "audit_logs"
     
     id = Column(Integer, primary_key=True, index=True)
@@ -51,8 +52,38 @@ class AuditLog(Base):
     details = Column(Text)
     ip_address = Column(String(45))
     user_agent = Column(Text)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
     
     # Relationships
     user = relationship("User", back_populates="audit_logs")
-    link = relationship("Link", back_populates="audit_logs") 
\ No newline at end of file
+    link = relationship("Link", back_populates="audit_logs") 
+
+
+class AuditAccessDaily(Base):
+    # Daily access totals rolled up from audit partitions before they are dropped
+    __tablename__ = "audit_access_daily"
+    
+    link_id = Column(Integer, primary_key=True)
+    day = Column(Date, primary_key=True)
+    accesses = Column(BigInteger, nullable=False)
+    unique_ips = Column(Integer, nullable=False)
+
+
+class LinkClickRollup(Base):
+    # Clicks and approximate unique visitors per link and hour or day (app/analytics.py)
+    __tablename__ = "link_click_rollups"
+    
+    link_id = Column(Integer, primary_key=True)
+    granularity = Column(String(4), primary_key=True)  # hour, day
+    bucket_start = Column(DateTime(timezone=True), primary_key=True)
+    clicks = Column(BigInteger, nullable=False)
+    unique_visitors = Column(Integer, nullable=False)
+
+
+class WriteBehindFlush(Base):
+    # Flush ids already applied from Redis, recorded with the writes (app/writebehind.py)
+    __tablename__ = "write_behind_flushes"
+    
+    flush_id = Column(String(32), primary_key=True)
+    name = Column(String(50), nullable=False)
+    applied_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False, index=True)
@@ -0,0 +1,49 @@
+import base64
+import json
+from datetime import datetime
+from typing import Optional
+from fastapi import HTTPException, status
+from sqlalchemy import tuple_
+
+
+def encode_cursor(created_at: datetime, row_id: int) -> str:
+    """Opaque cursor pointing just past a row in (created_at, id) order"""
+    raw = json.dumps([created_at.isoformat(), row_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    """Inverse of encode_cursor, raising ValueError for anything malformed"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(padded))
+        return datetime.fromisoformat(created_at), int(row_id)
+    except Exception as exc:
+        raise ValueError("Invalid cursor") from exc
+
+
+def keyset_page(query, model, after: Optional[tuple[datetime, int]], limit: int):
+    """Newest-first page of a query that starts after the given (created_at, id)"""
+    if after:
+        query = query.where(tuple_(model.created_at, model.id) < tuple_(*after))
+    return query.order_by(model.created_at.desc(), model.id.desc()).limit(limit)
+
+
+def next_cursor(rows: list, limit: int) -> Optional[str]:
+    """Cursor for the page after rows, or None if this was the last page"""
+    if len(rows) < limit:
+        return None
+    return encode_cursor(rows[-1].created_at, rows[-1].id)
+
+
+def get_cursor(cursor: Optional[str] = None) -> Optional[tuple[datetime, int]]:
+    """Dependency decoding the optional cursor query parameter"""
+    if cursor is None:
+        return None
+    try:
+        return decode_cursor(cursor)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
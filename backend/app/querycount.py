@@ -0,0 +1,71 @@
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional
+from sqlalchemy import event
+from app.config import settings
+from app.database import async_engine, engine, replica_engines
+
+logger = logging.getLogger(__name__)
+
+
+class QueryStats:
+    """SQL statements and database time spent while handling one request"""
+    
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.statements: dict[str, int] = {}
+    
+    def repeated_statements(self, threshold: int) -> dict[str, int]:
+        """Statements run at least threshold times, the usual sign of an N+1 pattern"""
+        return {sql: count for sql, count in self.statements.items() if count >= threshold}
+
+
+# Totals across all requests since startup, reported under /info
+query_totals = {"requests": 0, "queries": 0, "seconds": 0.0, "n_plus_one_warnings": 0}
+
+_current_stats: ContextVar[Optional[QueryStats]] = ContextVar("query_stats", default=None)
+
+
+@contextmanager
+def track_queries() -> Iterator[QueryStats]:
+    """Count the queries run by the current task inside the block"""
+    stats = QueryStats()
+    token = _current_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        _current_stats.reset(token)
+
+
+def record_request(path: str, stats: QueryStats) -> bool:
+    """Add a finished request to the totals and warn about likely N+1 queries, returning whether it did"""
+    query_totals["requests"] += 1
+    query_totals["queries"] += stats.count
+    query_totals["seconds"] += stats.seconds
+    repeated = stats.repeated_statements(settings.n_plus_one_threshold)
+    if repeated:
+        query_totals["n_plus_one_warnings"] += 1
+        for sql, count in repeated.items():
+            logger.warning("Possible N+1 on %s: %d x %s", path, count, sql)
+    return bool(repeated)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._query_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current_stats.get()
+    if stats is None:
+        return
+    stats.count += 1
+    stats.seconds += time.perf_counter() - context._query_started
+    stats.statements[statement] = stats.statements.get(statement, 0) + 1
+
+
+for instrumented_engine in (engine, async_engine.sync_engine, *(replica.sync_engine for replica in replica_engines)):
+    event.listen(instrumented_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(instrumented_engine, "after_cursor_execute", _after_cursor_execute)
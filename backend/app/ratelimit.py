@@ -0,0 +1,145 @@
+import ipaddress
+import logging
+import math
+import time
+from fastapi import HTTPException, Request, status
+from jose import JWTError, jwt
+from app.cache import redis_client
+from app.config import settings
+from app.user_cache import UserCache
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMIT_KEY_PREFIX = "rate_limit"
+
+TRUSTED_PROXY_NETWORKS = [ipaddress.ip_network(proxy, strict=False) for proxy in settings.trusted_proxies]
+
+# Token bucket shared by every worker. The bucket holds up to ARGV[1] tokens
+# and refills at ARGV[2] tokens per millisecond; a request takes ARGV[4].
+# Returns {allowed, tokens left, milliseconds until the request would fit}.
+TOKEN_BUCKET_SCRIPT = redis_client.register_script("""
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local cost = tonumber(ARGV[4])
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(bucket[1]) or capacity
+local ts = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+local retry_after = 0
+if tokens >= cost then
+    tokens = tokens - cost
+    allowed = 1
+else
+    retry_after = math.ceil((cost - tokens) / rate)
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / rate))
+return {allowed, math.floor(tokens), retry_after}
+""")
+
+
+def _is_trusted_proxy(address: str) -> bool:
+    try:
+        ip = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(ip in network for network in TRUSTED_PROXY_NETWORKS)
+
+
+def client_address(request: Request) -> str:
+    """Address of the client, read from X-Forwarded-For when the peer is a trusted proxy"""
+    peer = request.client.host if request.client else "unknown"
+    if not TRUSTED_PROXY_NETWORKS or not _is_trusted_proxy(peer):
+        return peer
+    forwarded = [address.strip() for address in request.headers.get("x-forwarded-for", "").split(",") if address.strip()]
+    # Proxies append the address they saw, so the nearest untrusted hop is the client;
+    # anything further left was supplied by the client and cannot be believed
+    for address in reversed(forwarded):
+        if not _is_trusted_proxy(address):
+            return address
+    return forwarded[0] if forwarded else peer
+
+
+def client_id(request: Request) -> str:
+    """Token subject for authenticated requests, otherwise the client address"""
+    authorization = request.headers.get("authorization", "")
+    scheme, _, token = authorization.partition(" ")
+    if scheme.lower() == "bearer" and token:
+        # Same cache get_current_user fills, so this rarely verifies a signature
+        username = UserCache.get_token_subject(token)
+        if username is None:
+            try:
+                payload = jwt.decode(token, settings.secret_key, algorithms=[settings.jwt_algorithm])
+                username = payload.get("sub")
+            except JWTError:
+                username = None
+        if username:
+            return f"user:{username}"
+    return client_address(request)
+
+
+def route_limit(route: str, client: str) -> int:
+    """Requests per minute for a route and client; 0 means unlimited"""
+    overrides = settings.rate_limit_overrides.get(client, {})
+    if route in overrides:
+        return overrides[route]
+    return settings.rate_limit_routes.get(route, settings.rate_limit_per_minute)
+
+
+class RateLimiter:
+    """Per-route, per-client token buckets kept in Redis"""
+    
+    @staticmethod
+    async def hit(route: str, client: str, per_minute: int) -> tuple[bool, int, float]:
+        """Take one token, returning (allowed, remaining, seconds to wait)"""
+        try:
+            allowed, remaining, retry_after_ms = await TOKEN_BUCKET_SCRIPT(
+                keys=[f"{RATE_LIMIT_KEY_PREFIX}:{route}:{client}"],
+                args=[per_minute, per_minute / 60000, int(time.time() * 1000), 1]
+            )
+        except Exception as exc:
+            # Fail open: an unavailable Redis should not take the API down with it
+            logger.warning(f"Rate limiter unavailable: {exc}")
+            return True, per_minute, 0.0
+        return bool(allowed), int(remaining), retry_after_ms / 1000
+    
+    @staticmethod
+    def dependency(route: str):
+        """FastAPI dependency that rejects clients over the route's limit with 429"""
+        
+        async def check(request: Request) -> None:
+            if not settings.rate_limit_enabled:
+                return
+            client = client_id(request)
+            per_minute = route_limit(route, client)
+            if per_minute <= 0:
+                return
+            allowed, remaining, retry_after = await RateLimiter.hit(route, client, per_minute)
+            if not allowed:
+                raise HTTPException(
+                    status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                    detail="Rate limit exceeded",
+                    headers={
+                        "Retry-After": str(max(1, math.ceil(retry_after))),
+                        "X-RateLimit-Limit": str(per_minute),
+                        "X-RateLimit-Remaining": str(remaining),
+                    }
+                )
+        
+        return check
+
+
+def rate_limit(route: str):
+    """Route dependency; pass it in the decorator's dependencies so it runs before the session is used"""
+    return RateLimiter.dependency(route)
+
+
+def rate_limit_stats() -> dict:
+    return {
+        "enabled": settings.rate_limit_enabled,
+        "default_per_minute": settings.rate_limit_per_minute,
+        "routes": settings.rate_limit_routes,
+        "overridden_clients": len(settings.rate_limit_overrides),
+    }
@@ -0,0 +1,104 @@
+import logging
+from fastapi import Depends, Request
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.cache import redis_client
+from app.config import settings
+from app.database import ReplicaSessionLocal, get_async_db, replica_engines
+from app.ratelimit import client_id
+
+logger = logging.getLogger(__name__)
+
+# Set for a client when it writes; while it exists its reads go to the primary
+RECENT_WRITE_KEY = "db:recent_write:{client}"
+
+# Set for a link when it is created, changed or deleted; while it exists cache
+# loads of that link read the primary, so a lagging replica cannot refill the cache
+RECENT_LINK_WRITE_KEY = "db:recent_link_write:{short_code}"
+
+SAFE_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+# Where reads were sent since startup, reported under /info
+read_totals = {"replica": 0, "primary_after_write": 0, "primary_after_link_write": 0, "primary_confirmed_misses": 0}
+
+
+class ReadRouting:
+    """Replica reads with a sticky-primary window after each client's own writes"""
+    
+    @staticmethod
+    async def mark_write(client: str) -> None:
+        try:
+            await redis_client.set(
+                RECENT_WRITE_KEY.format(client=client),
+                "1",
+                px=int(settings.database_read_your_writes_seconds * 1000)
+            )
+        except Exception as exc:
+            logger.warning(f"Could not record a write for read-your-writes routing: {exc}")
+    
+    @staticmethod
+    async def wrote_recently(client: str) -> bool:
+        try:
+            return bool(await redis_client.exists(RECENT_WRITE_KEY.format(client=client)))
+        except Exception:
+            # Without Redis we cannot tell, and the primary is always up to date
+            return True
+    
+    @staticmethod
+    async def mark_links_written(short_codes: list[str]) -> None:
+        """Start the sticky-primary window for cache loads of these links"""
+        if not replica_engines or not short_codes:
+            return
+        try:
+            pipe = redis_client.pipeline(transaction=False)
+            for short_code in short_codes:
+                pipe.set(
+                    RECENT_LINK_WRITE_KEY.format(short_code=short_code),
+                    "1",
+                    px=int(settings.database_read_your_writes_seconds * 1000)
+                )
+            await pipe.execute()
+        except Exception as exc:
+            logger.warning(f"Could not record link writes for read-your-writes routing: {exc}")
+    
+    @staticmethod
+    async def links_written_recently(short_codes: list[str]) -> set[str]:
+        """Which of the links are still in their sticky-primary window"""
+        if not replica_engines or not short_codes:
+            return set()
+        try:
+            markers = await redis_client.mget([RECENT_LINK_WRITE_KEY.format(short_code=code) for code in short_codes])
+        except Exception:
+            return set(short_codes)
+        return {short_code for short_code, marker in zip(short_codes, markers) if marker}
+
+
+async def get_read_db(request: Request, primary_db: AsyncSession = Depends(get_async_db)):
+    """Dependency for reads that may be served by a replica"""
+    # Primary reads share the request's session with get_current_user, so one
+    # request never holds two connections from the same pool
+    if not replica_engines:
+        yield primary_db
+        return
+    if await ReadRouting.wrote_recently(client_id(request)):
+        read_totals["primary_after_write"] += 1
+        yield primary_db
+        return
+    read_totals["replica"] += 1
+    async with ReplicaSessionLocal() as db:
+        yield db
+
+
+async def get_write_db(request: Request, db: AsyncSession = Depends(get_async_db)):
+    """Dependency for requests that write; starts the client's sticky-primary window"""
+    # Marked before the write, so the window also covers the rest of this request
+    if replica_engines and request.method not in SAFE_METHODS:
+        await ReadRouting.mark_write(client_id(request))
+    yield db
+
+
+def read_routing_stats() -> dict:
+    return {
+        "replicas": len(replica_engines),
+        "read_your_writes_seconds": settings.database_read_your_writes_seconds,
+        **read_totals,
+    }
@@ -0,0 +1,158 @@
+import asyncio
+import math
+import random
+from typing import Optional
+from app.cache import TOMBSTONE, CacheService, link_cache_data, redis_client
+from app.config import settings
+from app.counters import AccessCounterService
+from app.crud import CRUDLink
+from app.database import AsyncSessionLocal, ReplicaSessionLocal, replica_engines
+from app.replicas import ReadRouting, read_totals
+
+# How often a worker waiting on another worker's load checks the cache
+LOAD_WAIT_POLL_SECONDS = 0.025
+
+
+def _should_refresh_early(ttl_seconds: float) -> bool:
+    """Probabilistic early expiration: more likely the closer the entry is to expiring"""
+    window = settings.link_cache_early_refresh_seconds
+    if window <= 0:
+        return False
+    return ttl_seconds < -window * math.log(1.0 - random.random())
+
+
+class LinkResolver:
+    """Cache-first link lookup with one loader per short code"""
+    
+    # Loads in flight in this process, shared by every request for the same code
+    _loads: dict[str, asyncio.Task] = {}
+    
+    @staticmethod
+    async def resolve(short_code: str, record_access: bool = False) -> dict:
+        """Link data for a short code, or a tombstone if it does not resolve, optionally counting the click"""
+        if record_access:
+            # Cache hits read and count with a single Redis round trip
+            link_data, ttl_seconds = await AccessCounterService.get_link_and_record_access(short_code)
+        else:
+            link_data, ttl_seconds = await CacheService.get_link_entry(short_code)
+        if link_data is None:
+            link_data = await LinkResolver._load_once(short_code, refresh=False)
+            if record_access and link_data.get("is_active"):
+                await AccessCounterService.record_access(link_data["id"])
+            return link_data
+        # Tombstones just expire: refreshing one cannot replace it (set_tombstone is NX)
+        if ttl_seconds is not None and not link_data.get("tombstone") and _should_refresh_early(ttl_seconds):
+            # Serve the current entry and refresh it in the background
+            LinkResolver._start_load(short_code, refresh=True)
+        return link_data
+    
+    @staticmethod
+    async def resolve_many(short_codes: list[str]) -> dict[str, dict]:
+        """Link data or a tombstone for each short code, with one cache and one database round trip"""
+        resolved = await CacheService.get_links(short_codes)
+        misses = [short_code for short_code in short_codes if short_code not in resolved]
+        if not misses:
+            return resolved
+        
+        recently_written = await ReadRouting.links_written_recently(misses)
+        from_replica = [short_code for short_code in misses if short_code not in recently_written]
+        db_links = []
+        if from_replica:
+            async with ReplicaSessionLocal() as db:
+                db_links = await CRUDLink.get_many_for_resolve(db, from_replica)
+        if replica_engines:
+            # Links written in the last few seconds come from the primary, and so does
+            # confirming a miss, as a lagging replica may not have a new link yet
+            found = {db_link.short_code for db_link in db_links if db_link.is_active}
+            from_primary = [short_code for short_code in misses if short_code not in found]
+            if from_primary:
+                read_totals["primary_after_link_write"] += len(recently_written)
+                read_totals["primary_confirmed_misses"] += len(from_primary) - len(recently_written)
+                async with AsyncSessionLocal() as db:
+                    db_links = [db_link for db_link in db_links if db_link.is_active]
+                    db_links += await CRUDLink.get_many_for_resolve(db, from_primary)
+        loaded = [link_cache_data(db_link) for db_link in db_links if db_link.is_active]
+        for link_data in loaded:
+            resolved[link_data["short_code"]] = link_data
+        unresolved = [short_code for short_code in misses if short_code not in resolved]
+        
+        await CacheService.set_links(loaded)
+        await CacheService.set_tombstones(unresolved)
+        for short_code in unresolved:
+            resolved[short_code] = TOMBSTONE
+        return resolved
+    
+    @staticmethod
+    def _start_load(short_code: str, refresh: bool) -> asyncio.Task:
+        task = LinkResolver._loads.get(short_code)
+        if task is None:
+            task = asyncio.create_task(LinkResolver._load(short_code, refresh))
+            LinkResolver._loads[short_code] = task
+            task.add_done_callback(lambda _: LinkResolver._loads.pop(short_code, None))
+        return task
+    
+    @staticmethod
+    async def _load_once(short_code: str, refresh: bool) -> dict:
+        # Shielded so one disconnecting client does not cancel the load for the others
+        link_data = await asyncio.shield(LinkResolver._start_load(short_code, refresh))
+        if link_data is None:
+            # Joined a background refresh that another worker was already doing
+            link_data = await CacheService.get_link(short_code) or await LinkResolver._load(short_code, refresh=False)
+        return link_data
+    
+    @staticmethod
+    async def _load(short_code: str, refresh: bool) -> Optional[dict]:
+        """Load a link from the database into the cache, coordinating with other workers"""
+        lock_key = f"link_lock:{short_code}"
+        try:
+            locked = bool(await redis_client.set(lock_key, "1", nx=True, px=settings.link_load_lock_ms))
+            contended = not locked
+        except Exception:
+            # Without Redis there is nobody to coordinate with
+            locked = contended = False
+        
+        if contended:
+            if refresh:
+                return None
+            link_data = await LinkResolver._wait_for_cache(short_code)
+            if link_data is not None:
+                return link_data
+        
+        try:
+            if await ReadRouting.links_written_recently([short_code]):
+                # The replica may still have the link as it was before the write
+                read_totals["primary_after_link_write"] += 1
+                async with AsyncSessionLocal() as db:
+                    db_link = await CRUDLink.get_for_resolve(db, short_code)
+            else:
+                async with ReplicaSessionLocal() as db:
+                    db_link = await CRUDLink.get_for_resolve(db, short_code)
+                if replica_engines and (not db_link or not db_link.is_active):
+                    # A lagging replica may not have the link yet; only the primary can rule it out
+                    read_totals["primary_confirmed_misses"] += 1
+                    async with AsyncSessionLocal() as db:
+                        db_link = await CRUDLink.get_for_resolve(db, short_code)
+            if not db_link or not db_link.is_active:
+                await CacheService.set_tombstone(short_code)
+                return TOMBSTONE
+            link_data = link_cache_data(db_link)
+            await CacheService.set_link(short_code, link_data)
+            return link_data
+        finally:
+            if locked:
+                try:
+                    await redis_client.delete(lock_key)
+                except Exception:
+                    pass
+    
+    @staticmethod
+    async def _wait_for_cache(short_code: str) -> Optional[dict]:
+        """Wait for another worker's load to show up in the cache"""
+        deadline = asyncio.get_running_loop().time() + settings.link_load_lock_ms / 1000
+        while asyncio.get_running_loop().time() < deadline:
+            await asyncio.sleep(LOAD_WAIT_POLL_SECONDS)
+            link_data = await CacheService.get_link(short_code)
+            if link_data is not None:
+                return link_data
+        # The other loader died or is slow; load it ourselves
+        return None
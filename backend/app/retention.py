@@ -0,0 +1,161 @@
+import argparse
+import asyncio
+import json
+import logging
+from datetime import datetime, timezone
+from typing import Optional
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+from app.config import settings
+from app.database import async_engine
+
+logger = logging.getLogger(__name__)
+
+# audit_logs is range partitioned by month (migration 0004) into tables named
+# audit_logs_pYYYY_MM, plus audit_logs_default for anything outside them.
+PARTITION_PREFIX = "audit_logs_p"
+
+# Advisory lock taken by each maintenance transaction so workers do not overlap
+MAINTENANCE_LOCK_ID = 0x6175646974  # "audit"
+
+ROLLUP_SQL = """
+INSERT INTO audit_access_daily (link_id, day, accesses, unique_ips)
+SELECT link_id, (created_at AT TIME ZONE 'UTC')::date, count(*), count(DISTINCT ip_address)
+FROM {partition}
+WHERE action = 'access' AND link_id IS NOT NULL
+GROUP BY 1, 2
+ON CONFLICT (link_id, day) DO UPDATE SET
+    accesses = audit_access_daily.accesses + excluded.accesses,
+    unique_ips = greatest(audit_access_daily.unique_ips, excluded.unique_ips)
+"""
+
+
+def month_start(value: datetime) -> datetime:
+    return value.astimezone(timezone.utc).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def add_months(month: datetime, count: int) -> datetime:
+    """First of the month count months after (or before) a month start"""
+    index = month.year * 12 + month.month - 1 + count
+    return month.replace(year=index // 12, month=index % 12 + 1)
+
+
+def partition_name(month: datetime) -> str:
+    return f"{PARTITION_PREFIX}{month:%Y_%m}"
+
+
+def create_partition_sql(month: datetime) -> str:
+    """DDL for the partition holding one UTC month of audit events"""
+    return (
+        f"CREATE TABLE IF NOT EXISTS {partition_name(month)} PARTITION OF audit_logs "
+        f"FOR VALUES FROM ('{month:%Y-%m-%d} 00:00:00+00') TO ('{add_months(month, 1):%Y-%m-%d} 00:00:00+00')"
+    )
+
+
+class AuditRetentionService:
+    """Monthly audit_logs partitions: create ahead, roll up and drop when expired"""
+    
+    @staticmethod
+    async def is_partitioned(conn: AsyncConnection) -> bool:
+        result = await conn.execute(text("SELECT relkind::text FROM pg_class WHERE oid = to_regclass('audit_logs')"))
+        return result.scalar() == "p"
+    
+    @staticmethod
+    async def list_partitions(conn: AsyncConnection) -> list[tuple[str, datetime]]:
+        """Monthly partitions as (name, month start), oldest first"""
+        result = await conn.execute(text(
+            "SELECT child.relname FROM pg_inherits "
+            "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+            "WHERE pg_inherits.inhparent = to_regclass('audit_logs')"
+        ))
+        partitions = []
+        for name in result.scalars():
+            if not name.startswith(PARTITION_PREFIX):
+                continue
+            month = datetime.strptime(name[len(PARTITION_PREFIX):], "%Y_%m").replace(tzinfo=timezone.utc)
+            partitions.append((name, month))
+        return sorted(partitions, key=lambda partition: partition[1])
+    
+    @staticmethod
+    async def ensure_partitions(conn: AsyncConnection, now: datetime) -> list[str]:
+        """Create partitions from the current month through the configured months ahead"""
+        existing = {name for name, _ in await AuditRetentionService.list_partitions(conn)}
+        created = []
+        current = month_start(now)
+        for offset in range(settings.audit_partition_months_ahead + 1):
+            month = add_months(current, offset)
+            if partition_name(month) not in existing:
+                await conn.execute(text(create_partition_sql(month)))
+                created.append(partition_name(month))
+        return created
+    
+    @staticmethod
+    async def _locked(conn: AsyncConnection) -> bool:
+        result = await conn.execute(text("SELECT pg_try_advisory_xact_lock(:id)"), {"id": MAINTENANCE_LOCK_ID})
+        return bool(result.scalar())
+    
+    @staticmethod
+    async def run(now: Optional[datetime] = None, dry_run: bool = False) -> dict:
+        """Create upcoming partitions, then roll up and drop the ones past retention"""
+        now = now or datetime.now(timezone.utc)
+        cutoff = add_months(month_start(now), -settings.audit_retention_months)
+        summary = {"created": [], "dropped": [], "rolled_up_rows": 0, "cutoff": cutoff.isoformat()}
+        
+        async with async_engine.begin() as conn:
+            if not await AuditRetentionService.is_partitioned(conn):
+                summary["skipped"] = "audit_logs is not partitioned; run alembic upgrade head"
+                return summary
+            if not await AuditRetentionService._locked(conn):
+                summary["skipped"] = "another worker is running maintenance"
+                return summary
+            expired = [
+                (name, month) for name, month in await AuditRetentionService.list_partitions(conn)
+                if add_months(month, 1) <= cutoff
+            ]
+            if dry_run:
+                summary["dropped"] = [name for name, _ in expired]
+                return summary
+            summary["created"] = await AuditRetentionService.ensure_partitions(conn, now)
+        
+        # One transaction per partition keeps the lock on audit_logs short
+        for name, _ in expired:
+            async with async_engine.begin() as conn:
+                if not await AuditRetentionService._locked(conn):
+                    break
+                exists = await conn.execute(text("SELECT to_regclass(:name)"), {"name": name})
+                if exists.scalar() is None:
+                    continue
+                rollup = await conn.execute(text(ROLLUP_SQL.format(partition=name)))
+                # Give up rather than queue audit writes behind a long-running reader
+                await conn.execute(text(f"SET LOCAL lock_timeout = '{settings.audit_drop_lock_timeout_ms}ms'"))
+                await conn.execute(text(f"DROP TABLE {name}"))
+            summary["dropped"].append(name)
+            summary["rolled_up_rows"] += rollup.rowcount
+            logger.info(f"Dropped audit partition {name} after rolling up {rollup.rowcount} daily rows")
+        return summary
+
+
+async def run_audit_maintenance() -> None:
+    """Run partition maintenance at startup and then every interval until cancelled"""
+    while True:
+        try:
+            summary = await AuditRetentionService.run()
+            if summary["created"] or summary["dropped"]:
+                logger.info(f"Audit partition maintenance: {summary}")
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.warning("Audit partition maintenance failed, will retry", exc_info=True)
+        await asyncio.sleep(settings.audit_maintenance_interval_seconds)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Create upcoming audit log partitions and drop expired ones")
+    parser.add_argument("--dry-run", action="store_true", help="Only report the partitions that would be dropped")
+    args = parser.parse_args()
+    summary = asyncio.run(AuditRetentionService.run(dry_run=args.dry_run))
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
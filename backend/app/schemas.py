@@ -1,5 +1,5 @@
 from pydantic import BaseModel, HttpUrl, validator
-from typing import Optional, List
+from typing import Dict, Optional, List
 from datetime import datetime
 
 
@@ -22,6 +22,11 @@ class User(UserBase):
         from_attributes = True
 
 
+class UserAdminUpdate(BaseModel):
+    is_active: Optional[bool] = None
+    is_admin: Optional[bool] = None
+
+
 class UserLogin(BaseModel):
     username: str
     password: str
@@ -92,6 +97,21 @@ class LinkStats(BaseModel):
         from_attributes = True
 
 
+class LinkStatsPoint(BaseModel):
+    bucket_start: datetime
+    clicks: int
+    unique_visitors: int  # approximate (HyperLogLog of address and user agent)
+
+
+class LinkStatsSeries(BaseModel):
+    short_code: str
+    granularity: str
+    start: datetime
+    end: datetime
+    total_clicks: int
+    points: List[LinkStatsPoint]
+
+
 class AuditLogBase(BaseModel):
     action: str
     details: Optional[str] = None
@@ -111,8 +131,38 @@ class AuditLog(AuditLogBase):
         from_attributes = True
 
 
+class AuditLogList(BaseModel):
+    audit_logs: List[AuditLog]
+    next_cursor: Optional[str] = None
+
+
+class BatchResolveRequest(BaseModel):
+    short_codes: List[str]
+
+
+class BatchResolveResult(BaseModel):
+    links: Dict[str, str]  # short code -> target URL
+    not_found: List[str]
+
+
+class BulkImportError(BaseModel):
+    row: int
+    error: str
+
+
+class BulkImportResult(BaseModel):
+    received: int
+    created: int
+    conflicts: int
+    invalid: int
+    errors: List[BulkImportError]  # first 100 rejected rows
+    seconds: float
+
+
 class LinkList(BaseModel):
     links: List[Link]
-    total: int
+    total: Optional[int] = None  # omitted for cursor pages
+    total_is_estimate: bool = False
     page: int
-    per_page: int 
\ No newline at end of file
+    per_page: int
+    next_cursor: Optional[str] = None 
\ No newline at end of file
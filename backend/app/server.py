@@ -0,0 +1,89 @@
+"""Production server: migrate once, then run gunicorn with preloaded uvicorn workers.
+
+    python -m app.server
+
+Migrations run in a subprocess before the app is imported, so workers never
+race each other on DDL. The app is imported once in the master and forked into
+WEB_WORKERS workers; each worker connects to Postgres and Redis from its own
+lifespan handler.
+"""
+import logging
+import multiprocessing
+import os
+import shutil
+import subprocess
+import sys
+import time
+from gunicorn.app.base import BaseApplication
+from app.config import settings
+
+logger = logging.getLogger("app.server")
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run_migrations() -> float:
+    """Apply Alembic migrations, returning how long they took"""
+    started = time.monotonic()
+    # A separate process keeps Alembic's logging setup and connections out of the master
+    subprocess.run([sys.executable, "-m", "alembic", "upgrade", "head"], cwd=BACKEND_DIR, check=True)
+    return time.monotonic() - started
+
+
+def reset_metrics_dir() -> None:
+    """Remove samples left in PROMETHEUS_MULTIPROC_DIR by workers of a previous run"""
+    path = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+    if not path:
+        return
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path, exist_ok=True)
+
+
+def when_ready(server) -> None:
+    from app.startup import startup_status
+    server.log.info(f"App imported in {startup_status['imported']}s; forking {server.num_workers} workers")
+
+
+def child_exit(server, worker) -> None:
+    # Drop the dead worker's live gauges from the aggregated /metrics output
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
+
+
+class Server(BaseApplication):
+    """Gunicorn configured from Settings instead of a config file"""
+    
+    def __init__(self, options: dict):
+        self.options = options
+        super().__init__()
+    
+    def load_config(self) -> None:
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+    
+    def load(self):
+        from app.main import app
+        return app
+
+
+def main() -> None:
+    logging.basicConfig(level=logging.INFO)
+    if settings.migrate_on_start:
+        logger.info(f"Migrations applied in {run_migrations():.2f}s")
+    reset_metrics_dir()
+    Server({
+        "bind": settings.web_bind,
+        "workers": settings.web_workers or multiprocessing.cpu_count(),
+        "worker_class": "uvicorn.workers.UvicornWorker",
+        "preload_app": True,
+        "timeout": settings.web_timeout_seconds,
+        "graceful_timeout": settings.web_graceful_timeout_seconds,
+        "keepalive": settings.web_keepalive_seconds,
+        "when_ready": when_ready,
+        "child_exit": child_exit,
+    }).run()
+
+
+if __name__ == "__main__":
+    main()
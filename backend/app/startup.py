@@ -0,0 +1,18 @@
+import os
+import time
+
+# Taken when app.main starts importing; it imports this module before anything else
+IMPORT_STARTED = time.monotonic()
+
+# Seconds from IMPORT_STARTED to each phase in this process. Under a preloading
+# server the import runs once in the master, so a worker's "ready" and
+# "first_request" include the time it waited to be forked.
+startup_status = {"pid": os.getpid(), "imported": None, "ready": None, "first_request": None}
+
+
+def mark_startup(phase: str) -> float:
+    """Record that a startup phase was reached, returning the seconds since import began"""
+    seconds = round(time.monotonic() - IMPORT_STARTED, 4)
+    startup_status["pid"] = os.getpid()
+    startup_status[phase] = seconds
+    return seconds
@@ -0,0 +1,17 @@
+"""Pytest helpers; enable with ``pytest_plugins = ["app.testing"]`` in a conftest"""
+import pytest
+
+
+@pytest.fixture
+def query_budget():
+    """Fail the test when a response ran more SQL queries than its budget"""
+    def check(response, max_queries: int) -> int:
+        header = response.headers.get("X-DB-Query-Count")
+        assert header is not None, "X-DB-Query-Count header missing; is query_count_headers_enabled on?"
+        query_count = int(header)
+        assert query_count <= max_queries, (
+            f"{response.request.method} {response.request.url.path} ran {query_count} queries, "
+            f"budget is {max_queries}"
+        )
+        return query_count
+    return check
@@ -0,0 +1,113 @@
+import json
+import time
+from datetime import datetime
+from typing import Optional
+from app.cache import LocalLinkCache, instance_id, redis_client, run_subscriber
+from app.config import settings
+from app.models import User
+
+USER_INVALIDATION_CHANNEL = "user_invalidations"
+
+# Columns cached for an authenticated user; the password hash never leaves the database
+USER_FIELDS = ("id", "username", "email", "is_active", "is_admin", "created_at", "updated_at")
+
+# Decoded token subjects, so repeated requests skip signature verification
+token_cache = LocalLinkCache(
+    max_entries=settings.user_cache_max_entries if settings.user_cache_enabled else 0,
+    ttl_seconds=settings.user_cache_ttl_seconds,
+)
+
+# Active user records keyed by token subject
+local_user_cache = LocalLinkCache(
+    max_entries=settings.user_cache_max_entries if settings.user_cache_enabled else 0,
+    ttl_seconds=settings.user_cache_ttl_seconds,
+)
+
+
+def _serialize(user: User) -> dict:
+    data = {field: getattr(user, field) for field in USER_FIELDS}
+    for field in ("created_at", "updated_at"):
+        if data[field] is not None:
+            data[field] = data[field].isoformat()
+    return data
+
+
+def _deserialize(data: dict) -> User:
+    """Detached User built from cached columns"""
+    data = dict(data)
+    for field in ("created_at", "updated_at"):
+        if data[field] is not None:
+            data[field] = datetime.fromisoformat(data[field])
+    return User(**data)
+
+
+class UserCache:
+    """Short-TTL cache of decoded tokens and active users"""
+    
+    @staticmethod
+    def get_token_subject(token: str) -> Optional[str]:
+        """Subject of a token verified earlier, if still cached"""
+        cached = token_cache.get(token)
+        return cached["sub"] if cached else None
+    
+    @staticmethod
+    def set_token_subject(token: str, subject: str, expires_at: Optional[float]) -> None:
+        """Remember a verified token until it expires"""
+        ttl_seconds = expires_at - time.time() if expires_at else None
+        if ttl_seconds is not None and ttl_seconds <= 0:
+            return
+        token_cache.set(token, {"sub": subject}, ttl_seconds=ttl_seconds)
+    
+    @staticmethod
+    async def get_user(username: str) -> Optional[User]:
+        """Cached active user, from this process or Redis"""
+        data = local_user_cache.get(username)
+        if data is None and settings.user_cache_redis_enabled:
+            try:
+                cached = await redis_client.get(f"user:{username}")
+            except Exception:
+                cached = None
+            if cached:
+                data = json.loads(cached)
+                local_user_cache.set(username, data)
+        return _deserialize(data) if data else None
+    
+    @staticmethod
+    async def set_user(user: User) -> None:
+        """Cache an active user"""
+        if not user.is_active:
+            return
+        data = _serialize(user)
+        local_user_cache.set(user.username, data)
+        if settings.user_cache_redis_enabled:
+            try:
+                await redis_client.setex(f"user:{user.username}", settings.user_cache_ttl_seconds, json.dumps(data))
+            except Exception:
+                pass
+    
+    @staticmethod
+    async def invalidate(username: str) -> bool:
+        """Drop a user everywhere, e.g. after deactivation or an admin change"""
+        local_user_cache.delete(username)
+        try:
+            await redis_client.delete(f"user:{username}")
+            await redis_client.publish(USER_INVALIDATION_CHANNEL, f"{instance_id}:{username}")
+            return True
+        except Exception:
+            return False
+
+
+def _handle_invalidation(message: dict) -> None:
+    origin, _, username = message["data"].partition(":")
+    if origin != instance_id:
+        local_user_cache.delete(username)
+
+
+async def _resync() -> None:
+    # Anything published while we were disconnected was missed
+    local_user_cache.clear()
+
+
+async def run_user_invalidation_listener() -> None:
+    """Apply user invalidations published by other workers until cancelled"""
+    await run_subscriber(USER_INVALIDATION_CHANNEL, _handle_invalidation, _resync)
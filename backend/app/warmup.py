@@ -0,0 +1,53 @@
+import argparse
+import asyncio
+import logging
+import time
+from app.cache import CacheService, link_cache_data
+from app.config import settings
+from app.crud import CRUDLink
+from app.database import ReplicaSessionLocal
+
+logger = logging.getLogger(__name__)
+
+# Readiness reported by /health
+warmup_status = {"done": False, "keys": 0, "seconds": None, "error": None}
+
+
+async def warm_link_cache(limit: int) -> dict:
+    """Load the most accessed links into Redis and the local cache"""
+    started = time.perf_counter()
+    async with ReplicaSessionLocal() as db:
+        links = await CRUDLink.get_most_accessed(db, limit=limit)
+    link_data = [link_cache_data(db_link) for db_link in links]
+    if link_data and not await CacheService.set_links(link_data):
+        raise RuntimeError("Redis rejected the warm-up writes")
+    return {"keys": len(link_data), "seconds": round(time.perf_counter() - started, 3)}
+
+
+async def run_warmup() -> None:
+    """Warm the cache at startup and mark the service ready when done"""
+    try:
+        warmup_status.update(await warm_link_cache(settings.cache_warmup_limit))
+        logger.info(
+            "Cache warm-up loaded %d keys in %.3fs",
+            warmup_status["keys"],
+            warmup_status["seconds"]
+        )
+    except Exception as exc:
+        # A cold cache is slower, not broken, so do not hold readiness back
+        warmup_status["error"] = str(exc)
+        logger.warning("Cache warm-up failed", exc_info=True)
+    finally:
+        warmup_status["done"] = True
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Load the most accessed links into the cache")
+    parser.add_argument("--limit", type=int, default=settings.cache_warmup_limit)
+    args = parser.parse_args()
+    result = asyncio.run(warm_link_cache(args.limit))
+    print(f"Loaded {result['keys']} keys in {result['seconds']}s")
+
+
+if __name__ == "__main__":
+    main()
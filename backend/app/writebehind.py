@@ -0,0 +1,113 @@
+import asyncio
+import logging
+import uuid
+from typing import Awaitable, Callable, Optional
+from redis.exceptions import LockError
+from app.cache import redis_client
+from app.crud import CRUDWriteBehindFlush
+from app.database import AsyncSessionLocal
+
+logger = logging.getLogger(__name__)
+
+# Deletes the flushing hashes and the flush id, unless another flush has
+# already finished this one and moved newer pending hashes aside
+DELETE_FLUSHED_SCRIPT = redis_client.register_script("""
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', unpack(KEYS))
+end
+return 0
+""")
+
+
+async def _keep_lock(lock, seconds: int) -> None:
+    """Extend a flush lock until cancelled, so a slow flush keeps it"""
+    while True:
+        await asyncio.sleep(seconds / 3)
+        try:
+            await lock.reacquire()
+        except LockError:
+            # Another worker may now retry this flush; the flush id stops it applying twice
+            logger.warning("Lost the flush lock %s", lock.name)
+            return
+
+
+class WriteBehindFlusher:
+    """Moves pending Redis hashes aside under a flush id and applies them to Postgres once"""
+    
+    def __init__(self, name: str, pending_keys: list[str], flushing_keys: list[str], lock_seconds: int):
+        self.name = name
+        self.pending_keys = pending_keys
+        self.flushing_keys = flushing_keys
+        self.flush_id_key = f"{name}:flush_id"
+        self.lock_key = f"{name}:flush_lock"
+        self.lock_seconds = lock_seconds
+    
+    async def _start(self) -> Optional[str]:
+        """Id of the flush to apply: a leftover one, or a new one for the pending hashes"""
+        pipe = redis_client.pipeline(transaction=True)
+        pipe.exists(self.flushing_keys[0])
+        pipe.get(self.flush_id_key)
+        leftover, flush_id = await pipe.execute()
+        # A leftover flushing hash means a previous flush did not finish
+        if leftover:
+            if flush_id is None:
+                await redis_client.set(self.flush_id_key, uuid.uuid4().hex, nx=True)
+                flush_id = await redis_client.get(self.flush_id_key)
+            return flush_id
+        if not await redis_client.exists(self.pending_keys[0]):
+            return None
+        
+        flush_id = uuid.uuid4().hex
+        pipe = redis_client.pipeline(transaction=True)
+        for pending_key, flushing_key in zip(self.pending_keys, self.flushing_keys):
+            pipe.rename(pending_key, flushing_key)
+        pipe.set(self.flush_id_key, flush_id)
+        await pipe.execute()
+        return flush_id
+    
+    async def run(self, apply: Callable[..., Awaitable[int]]) -> int:
+        """Flush once, returning what apply(db, *flushing hashes) reports as written"""
+        lock = redis_client.lock(self.lock_key, timeout=self.lock_seconds, blocking=False)
+        if not await lock.acquire():
+            return 0
+        keeper = asyncio.create_task(_keep_lock(lock, self.lock_seconds))
+        try:
+            flush_id = await self._start()
+            if flush_id is None:
+                return 0
+            
+            pipe = redis_client.pipeline(transaction=True)
+            for flushing_key in self.flushing_keys:
+                pipe.hgetall(flushing_key)
+            hashes = await pipe.execute()
+            
+            # The flush id commits with the writes, so a retry after a crash or a
+            # lost lock finds it and skips straight to the cleanup
+            async with AsyncSessionLocal() as db:
+                if await CRUDWriteBehindFlush.claim(db, self.name, flush_id):
+                    written = await apply(db, *hashes)
+                    await db.commit()
+                else:
+                    logger.info("Flush %s of %s was already applied", flush_id, self.name)
+                    written = 0
+            
+            await DELETE_FLUSHED_SCRIPT(keys=[self.flush_id_key, *self.flushing_keys], args=[flush_id])
+            return written
+        finally:
+            keeper.cancel()
+            try:
+                await lock.release()
+            except Exception:
+                pass
+
+
+async def run_flusher(flush: Callable[[], Awaitable[int]], interval_seconds: float, description: str) -> None:
+    """Call a flush every interval until cancelled, logging failures for the next run to retry"""
+    while True:
+        await asyncio.sleep(interval_seconds)
+        try:
+            await flush()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.warning("%s flush failed, will retry", description, exc_info=True)
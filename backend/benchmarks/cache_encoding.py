@@ -0,0 +1,94 @@
+"""Compare the JSON link cache format with the compact msgpack format.
+
+Reports bytes per value and encode/decode ops/sec, and with --redis also
+Redis memory per key and GET round trips per second:
+
+    python -m benchmarks.cache_encoding --keys 10000 --redis
+"""
+import argparse
+import asyncio
+import json
+import random
+import string
+import time
+from redis import asyncio as aioredis
+from app.cache import decode_link, encode_link
+from app.config import settings
+
+FORMATS = {
+    "json": (lambda data: json.dumps(data).encode(), lambda value: json.loads(value)),
+    "msgpack": (encode_link, decode_link),
+}
+
+
+def sample_links(count: int) -> list[dict]:
+    rng = random.Random(42)
+    links = []
+    for link_id in range(1, count + 1):
+        short_code = "".join(rng.choices(string.ascii_lowercase + string.digits, k=rng.randint(3, 12)))
+        links.append({
+            "id": link_id,
+            "short_code": short_code,
+            "target_url": f"https://wiki.example.com/{short_code}/" + "x" * rng.randint(10, 80),
+            "title": f"Link {short_code}",
+            "is_active": True,
+        })
+    return links
+
+
+def ops_per_second(func, items) -> float:
+    started = time.perf_counter()
+    for item in items:
+        func(item)
+    return len(items) / (time.perf_counter() - started)
+
+
+async def redis_results(name: str, values: list[bytes], decode) -> dict:
+    client = aioredis.from_url(settings.redis_url)
+    keys = [f"bench:{name}:{index}" for index in range(len(values))]
+    try:
+        pipe = client.pipeline(transaction=False)
+        for key, value in zip(keys, values):
+            pipe.set(key, value)
+        await pipe.execute()
+
+        sample = keys[:: max(1, len(keys) // 1000)]
+        pipe = client.pipeline(transaction=False)
+        for key in sample:
+            pipe.memory_usage(key)
+        memory = await pipe.execute()
+
+        started = time.perf_counter()
+        for key in keys:
+            decode(await client.get(key))
+        get_ops = len(keys) / (time.perf_counter() - started)
+
+        return {"redis_bytes_per_key": sum(memory) / len(memory), "get_decode_ops_per_sec": round(get_ops)}
+    finally:
+        for start in range(0, len(keys), 1000):
+            await client.delete(*keys[start:start + 1000])
+        await client.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--keys", type=int, default=10000)
+    parser.add_argument("--redis", action="store_true", help="Also measure against REDIS_URL")
+    args = parser.parse_args()
+
+    links = sample_links(args.keys)
+    results = {}
+    for name, (encode, decode) in FORMATS.items():
+        values = [encode(link) for link in links]
+        results[name] = {
+            "value_bytes_per_key": sum(map(len, values)) / len(values),
+            "encode_ops_per_sec": round(ops_per_second(encode, links)),
+            "decode_ops_per_sec": round(ops_per_second(decode, values)),
+        }
+        if args.redis:
+            results[name].update(asyncio.run(redis_results(name, values, decode)))
+    print(json.dumps({"keys": args.keys, "formats": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,20 @@
+"""Shape of the synthetic benchmark dataset, shared by the seeder and the load driver.
+
+Kept free of app imports so the load driver can swap in stand-ins before the
+app is loaded.
+"""
+
+BENCH_USERNAME = "bench"
+BENCH_PASSWORD = "bench-password"
+SHORT_CODE_PREFIX = "bn"
+
+WORDS = (
+    "wiki", "docs", "design", "roadmap", "oncall", "runbook", "dashboard", "metrics",
+    "payroll", "benefits", "hiring", "onboarding", "security", "release", "incident",
+    "budget", "planning", "review", "standup", "retro", "calendar", "handbook",
+)
+
+
+def short_code_for(index: int) -> str:
+    """Short code of the index-th seeded link (alphanumeric, unique)"""
+    return f"{SHORT_CODE_PREFIX}{index:07d}"
@@ -0,0 +1,207 @@
+"""Drive the API at fixed concurrency and report latency percentiles as JSON.
+
+Seed the database first (python -m benchmarks.seed), then run against a
+server:
+
+    python -m benchmarks.load --base-url http://localhost:8000 --output results.json
+
+or in process, without a server and with fakeredis standing in for Redis:
+
+    python -m benchmarks.load --in-process --fake-redis
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import math
+import os
+import random
+import subprocess
+import time
+import uuid
+from collections import Counter
+from contextlib import AsyncExitStack
+from datetime import datetime, timezone
+from typing import Awaitable, Callable
+import httpx
+from benchmarks.dataset import BENCH_PASSWORD, BENCH_USERNAME, WORDS, short_code_for
+
+SCENARIOS = ("resolve_hit", "resolve_miss", "resolve_404", "list_search", "login", "create")
+
+
+def percentile(sorted_values: list[float], fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = max(0, math.ceil(fraction * len(sorted_values)) - 1)
+    return sorted_values[index]
+
+
+async def run_scenario(
+    send: Callable[[int], Awaitable[httpx.Response]],
+    expected_status: int,
+    requests: int,
+    concurrency: int
+) -> dict:
+    """Send requests from concurrency workers and summarise latency and throughput"""
+    latencies: list[float] = []
+    statuses: Counter = Counter()
+    counter = itertools.count()
+
+    async def worker() -> None:
+        while (index := next(counter)) < requests:
+            started = time.perf_counter()
+            try:
+                response = await send(index)
+                statuses[str(response.status_code)] += 1
+            except httpx.HTTPError as exc:
+                statuses[type(exc).__name__] += 1
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": requests,
+        "errors": requests - statuses[str(expected_status)],
+        "statuses": dict(statuses),
+        "throughput_rps": round(requests / elapsed, 1),
+        "latency_ms": {
+            "p50": round(percentile(latencies, 0.50) * 1000, 3),
+            "p90": round(percentile(latencies, 0.90) * 1000, 3),
+            "p99": round(percentile(latencies, 0.99) * 1000, 3),
+            "mean": round(sum(latencies) / len(latencies) * 1000, 3) if latencies else 0.0,
+            "max": round(latencies[-1] * 1000, 3) if latencies else 0.0,
+        },
+    }
+
+
+async def run_benchmarks(client: httpx.AsyncClient, args: argparse.Namespace) -> dict:
+    token_response = await client.post(
+        "/auth/token", data={"username": BENCH_USERNAME, "password": BENCH_PASSWORD}
+    )
+    token_response.raise_for_status()
+    headers = {"Authorization": f"Bearer {token_response.json()['access_token']}"}
+
+    hot_codes = [short_code_for(index) for index in range(min(args.hot_links, args.links))]
+    miss_pool = max(1, args.links - len(hot_codes))
+    run_id = uuid.uuid4().hex[:6]
+    rng = random.Random(args.seed)
+
+    scenarios = {
+        "resolve_hit": (lambda i: client.get(f"/links/{hot_codes[i % len(hot_codes)]}"), 307),
+        # Codes after the hot set have not been requested since seeding
+        "resolve_miss": (lambda i: client.get(f"/links/{short_code_for(len(hot_codes) + i % miss_pool)}"), 307),
+        "resolve_404": (lambda i: client.get(f"/links/nx{rng.getrandbits(48):x}"), 404),
+        "list_search": (
+            lambda i: client.get("/links/", params={"search": WORDS[i % len(WORDS)], "limit": 20}, headers=headers),
+            200,
+        ),
+        "login": (
+            lambda i: client.post("/auth/token", data={"username": BENCH_USERNAME, "password": BENCH_PASSWORD}),
+            200,
+        ),
+        "create": (
+            lambda i: client.post(
+                "/links/",
+                json={"short_code": f"bc{run_id}{i}", "target_url": f"https://bench.example.com/{i}", "title": f"Bench {i}"},
+                headers=headers,
+            ),
+            200,
+        ),
+    }
+
+    # Put the hot set in the cache before measuring hits
+    for short_code in hot_codes:
+        await client.get(f"/links/{short_code}")
+
+    results = {}
+    for name in args.scenarios:
+        send, expected_status = scenarios[name]
+        requests = args.login_requests if name == "login" else args.requests
+        results[name] = await run_scenario(send, expected_status, requests, args.concurrency)
+        if name == "resolve_miss" and requests > miss_pool:
+            results[name]["note"] = "more requests than unrequested codes; later requests were cache hits"
+        print(f"{name}: {results[name]['throughput_rps']} req/s, p50 {results[name]['latency_ms']['p50']}ms, "
+              f"p99 {results[name]['latency_ms']['p99']}ms, errors {results[name]['errors']}")
+    return results
+
+
+def use_fake_redis() -> None:
+    """Point the app's Redis pools at an in-process fakeredis server (needs fakeredis[lua])"""
+    import fakeredis
+    import fakeredis.aioredis
+    from redis import asyncio as aioredis
+
+    server = fakeredis.FakeServer()
+
+    def fake_pool(url: str, **kwargs) -> aioredis.BlockingConnectionPool:
+        return aioredis.BlockingConnectionPool(
+            connection_class=fakeredis.aioredis.FakeConnection, server=server, **kwargs
+        )
+
+    aioredis.BlockingConnectionPool.from_url = staticmethod(fake_pool)
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+async def main_async(args: argparse.Namespace) -> dict:
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with AsyncExitStack() as stack:
+        if args.in_process:
+            # Every request comes from one client, so the limiter would reject most of them
+            os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+            if args.fake_redis:
+                use_fake_redis()
+            from app.main import app
+            await stack.enter_async_context(app.router.lifespan_context(app))
+            client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app, raise_app_exceptions=False), base_url="http://localhost")
+        else:
+            client = httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=args.timeout)
+        await stack.enter_async_context(client)
+        scenarios = await run_benchmarks(client, args)
+
+    return {
+        "commit": git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "target": "in-process" if args.in_process else args.base_url,
+        "concurrency": args.concurrency,
+        "links": args.links,
+        "scenarios": scenarios,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--in-process", action="store_true", help="Call the ASGI app directly instead of a server")
+    parser.add_argument("--fake-redis", action="store_true", help="With --in-process, use fakeredis instead of REDIS_URL")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--links", type=int, default=10000, help="Links seeded by benchmarks.seed")
+    parser.add_argument("--hot-links", type=int, default=100)
+    parser.add_argument("--requests", type=int, default=2000, help="Requests per scenario")
+    parser.add_argument("--login-requests", type=int, default=200, help="Requests for the (bcrypt bound) login scenario")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Write the JSON report to this file as well as stdout")
+    args = parser.parse_args()
+
+    report = asyncio.run(main_async(args))
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as handle:
+            handle.write(output + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""Compare the database side of a redirect cache miss: ORM entity vs lean Core row.
+
+Looks up seeded short codes one at a time, each in its own session as the
+resolver does, and reports latency percentiles for loading a full Link entity
+and for the resolve query that reads only the cached columns:
+
+    python -m benchmarks.resolve_query --links 100000 --lookups 5000
+
+Seed the database first (python -m benchmarks.seed). For the end to end
+latency of a cache miss, run the resolve_miss scenario of benchmarks.load.
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from typing import Awaitable, Callable
+from sqlalchemy import select
+from app.cache import link_cache_data
+from app.crud import CRUDLink
+from app.database import AsyncSessionLocal, async_engine
+from app.models import Link
+from benchmarks.dataset import short_code_for
+from benchmarks.load import percentile
+
+
+async def orm_entity(short_code: str) -> dict:
+    async with AsyncSessionLocal() as db:
+        return link_cache_data(await CRUDLink.get_by_short_code(db, short_code))
+
+
+async def core_row(short_code: str) -> dict:
+    async with AsyncSessionLocal() as db:
+        return link_cache_data(await CRUDLink.get_for_resolve(db, short_code))
+
+
+async def orm_entities(short_codes: list[str]) -> list[dict]:
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(select(Link).where(Link.short_code.in_(short_codes)))
+        return [link_cache_data(db_link) for db_link in result.scalars().all()]
+
+
+async def core_rows(short_codes: list[str]) -> list[dict]:
+    async with AsyncSessionLocal() as db:
+        return [link_cache_data(row) for row in await CRUDLink.get_many_for_resolve(db, short_codes)]
+
+
+async def measure(lookup: Callable[[object], Awaitable[object]], keys: list) -> dict:
+    latencies = []
+    started = time.perf_counter()
+    for key in keys:
+        lookup_started = time.perf_counter()
+        await lookup(key)
+        latencies.append(time.perf_counter() - lookup_started)
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "lookups_per_sec": round(len(keys) / elapsed),
+        "latency_ms": {
+            "p50": round(percentile(latencies, 0.50) * 1000, 3),
+            "p90": round(percentile(latencies, 0.90) * 1000, 3),
+            "p99": round(percentile(latencies, 0.99) * 1000, 3),
+        },
+    }
+
+
+async def main_async(args: argparse.Namespace) -> dict:
+    rng = random.Random(args.seed)
+    codes = [short_code_for(rng.randrange(args.links)) for _ in range(args.lookups)]
+    batches = [codes[start:start + args.batch_size] for start in range(0, len(codes), args.batch_size)]
+    cases = {
+        "single": (codes, {"orm_entity": orm_entity, "core_row": core_row}),
+        f"batch_of_{args.batch_size}": (batches, {"orm_entity": orm_entities, "core_row": core_rows}),
+    }
+
+    results = {}
+    try:
+        for case, (keys, lookups) in cases.items():
+            # Warm the pool, the statement caches and the table pages first
+            for lookup in lookups.values():
+                for key in keys[:args.warmup]:
+                    await lookup(key)
+            results[case] = {name: await measure(lookup, keys) for name, lookup in lookups.items()}
+            for name, result in results[case].items():
+                print(f"{case} {name}: {result['lookups_per_sec']}/s, p50 {result['latency_ms']['p50']}ms, "
+                      f"p99 {result['latency_ms']['p99']}ms")
+    finally:
+        await async_engine.dispose()
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--links", type=int, default=10000, help="Links seeded by benchmarks.seed")
+    parser.add_argument("--lookups", type=int, default=5000)
+    parser.add_argument("--batch-size", type=int, default=50, help="Short codes per batch resolve lookup")
+    parser.add_argument("--warmup", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Write the JSON report to this file as well as stdout")
+    args = parser.parse_args()
+
+    results = asyncio.run(main_async(args))
+    output = json.dumps({"links": args.links, "lookups": args.lookups, "results": results}, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as handle:
+            handle.write(output + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+"""Seed the database with a synthetic dataset for benchmarks.
+
+Rows are streamed into Postgres with COPY, so large datasets do not need
+much memory. Apply the migrations first:
+
+    alembic upgrade head
+    python -m benchmarks.seed --links 1000000 --audit-rows 50000000
+"""
+import argparse
+import io
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Iterator
+import redis
+from sqlalchemy import text
+from app.auth import get_password_hash
+from app.bloom import FILTER_KEY, FILTER_META_KEY
+from app.config import settings
+from app.database import engine
+from app.retention import add_months, create_partition_sql, month_start
+from benchmarks.dataset import BENCH_PASSWORD, BENCH_USERNAME, SHORT_CODE_PREFIX, WORDS, short_code_for
+
+
+def _copy_rows(connection, table: str, columns: str, rows: Iterator[str], batch_size: int) -> int:
+    """COPY tab-separated rows into a table in batches, returning the row count"""
+    cursor = connection.cursor()
+    count = 0
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write(row)
+        count += 1
+        if count % batch_size == 0:
+            buffer.seek(0)
+            cursor.copy_expert(f"COPY {table} ({columns}) FROM STDIN", buffer)
+            buffer = io.StringIO()
+    if buffer.tell():
+        buffer.seek(0)
+        cursor.copy_expert(f"COPY {table} ({columns}) FROM STDIN", buffer)
+    connection.commit()
+    return count
+
+
+def _link_rows(count: int, owner_ids: list[int], rng: random.Random) -> Iterator[str]:
+    now = datetime.now(timezone.utc)
+    for index in range(count):
+        words = rng.sample(WORDS, 2)
+        created_at = now - timedelta(seconds=rng.randint(0, 365 * 86400))
+        yield "\t".join((
+            short_code_for(index),
+            f"https://{words[0]}.example.com/{words[1]}/{index}",
+            f"{words[0].title()} {words[1]} {index}",
+            f"Synthetic {words[0]} link about {words[1]}",
+            str(rng.choice(owner_ids)),
+            created_at.isoformat(),
+            str(rng.randint(0, 5000)),
+            "t",
+        )) + "\n"
+
+
+def _audit_rows(count: int, link_ids: tuple[int, int], user_ids: list[int], rng: random.Random) -> Iterator[str]:
+    now = datetime.now(timezone.utc)
+    first_link, last_link = link_ids
+    for _ in range(count):
+        link_id = rng.randint(first_link, last_link)
+        created_at = now - timedelta(seconds=rng.randint(0, 365 * 86400))
+        yield "\t".join((
+            str(rng.choice(user_ids)),
+            str(link_id),
+            "access",
+            f"Accessed link {link_id}",
+            f"10.{rng.randint(0, 255)}.{rng.randint(0, 255)}.{rng.randint(1, 254)}",
+            "benchmark",
+            created_at.isoformat(),
+        )) + "\n"
+
+
+def reset_redis() -> int:
+    """Drop cached entries for seeded codes and the short code filter, which COPY bypassed"""
+    client = redis.from_url(settings.redis_url)
+    keys = list(client.scan_iter(match=f"link:{SHORT_CODE_PREFIX}*", count=10000))
+    for start in range(0, len(keys), 10000):
+        client.delete(*keys[start:start + 10000])
+    client.delete(FILTER_KEY, FILTER_META_KEY)
+    client.close()
+    return len(keys)
+
+
+def _timed(label: str, func: Callable[[], int]) -> dict:
+    started = time.perf_counter()
+    rows = func()
+    seconds = time.perf_counter() - started
+    print(f"{label}: {rows} rows in {seconds:.1f}s")
+    return {"rows": rows, "seconds": round(seconds, 3)}
+
+
+def seed(links: int, audit_rows: int, users: int, batch_size: int, seed_value: int) -> dict:
+    rng = random.Random(seed_value)
+    hashed_password = get_password_hash(BENCH_PASSWORD)
+    results = {}
+
+    with engine.begin() as conn:
+        # Remove a previous run so codes and the benchmark users can be reused
+        bench_users = "SELECT id FROM users WHERE username LIKE 'bench%'"
+        conn.execute(text(
+            f"DELETE FROM audit_logs WHERE user_id IN ({bench_users}) "
+            f"OR link_id IN (SELECT id FROM links WHERE created_by IN ({bench_users}))"
+        ))
+        conn.execute(text(f"DELETE FROM links WHERE created_by IN ({bench_users})"))
+        conn.execute(text("DELETE FROM users WHERE username LIKE 'bench%'"))
+        # Audit rows go back a year; give each month its partition once migrated
+        if conn.execute(text("SELECT relkind::text FROM pg_class WHERE oid = to_regclass('audit_logs')")).scalar() == "p":
+            current = month_start(datetime.now(timezone.utc))
+            for offset in range(-12, 1):
+                conn.execute(text(create_partition_sql(add_months(current, offset))))
+        user_ids = [
+            conn.execute(
+                text(
+                    "INSERT INTO users (username, email, hashed_password, is_active, is_admin) "
+                    "VALUES (:username, :email, :password, true, :is_admin) RETURNING id"
+                ),
+                {
+                    "username": BENCH_USERNAME if index == 0 else f"{BENCH_USERNAME}{index}",
+                    "email": f"{BENCH_USERNAME}{index}@example.com",
+                    "password": hashed_password,
+                    "is_admin": index == 0,
+                }
+            ).scalar_one()
+            for index in range(users)
+        ]
+
+    connection = engine.raw_connection()
+    try:
+        results["links"] = _timed("links", lambda: _copy_rows(
+            connection,
+            "links",
+            "short_code, target_url, title, description, created_by, created_at, access_count, is_active",
+            _link_rows(links, user_ids, rng),
+            batch_size,
+        ))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT min(id), max(id) FROM links WHERE short_code LIKE %s", (f"{SHORT_CODE_PREFIX}%",)
+            )
+            link_ids = cursor.fetchone()
+        if audit_rows and link_ids[0] is not None:
+            results["audit_logs"] = _timed("audit_logs", lambda: _copy_rows(
+                connection,
+                "audit_logs",
+                "user_id, link_id, action, details, ip_address, user_agent, created_at",
+                _audit_rows(audit_rows, link_ids, user_ids, rng),
+                batch_size,
+            ))
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE links")
+            cursor.execute("ANALYZE audit_logs")
+        connection.commit()
+    finally:
+        connection.close()
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--links", type=int, default=10000)
+    parser.add_argument("--audit-rows", type=int, default=100000)
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--batch-size", type=int, default=50000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    seed(args.links, args.audit_rows, max(1, args.users), args.batch_size, args.seed)
+    reset_redis()
+    print("Reset the Redis link cache and short code filter; restart the API so workers rebuild the filter.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""Tests run against the DATABASE_URL and REDIS_URL services, migrated to head"""
+import asyncio
+import os
+import uuid
+import httpx
+import pytest
+import pytest_asyncio
+from alembic import command
+from alembic.config import Config
+
+pytest_plugins = ["app.testing"]
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture(scope="session")
+def event_loop():
+    # One loop for the session, as the app's database and Redis pools are bound to it
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+
+@pytest.fixture(scope="session")
+def migrated_database():
+    command.upgrade(Config(os.path.join(BACKEND_DIR, "alembic.ini")), "head")
+
+
+@pytest_asyncio.fixture(scope="session")
+async def client(migrated_database):
+    from app.main import app
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as client:
+            yield client
+
+
+@pytest_asyncio.fixture
+async def auth_headers(client):
+    """Bearer token for a newly registered user"""
+    username = f"test-{uuid.uuid4().hex[:12]}"
+    password = "test-password"
+    response = await client.post(
+        "/auth/register",
+        json={"username": username, "email": f"{username}@example.com", "password": password}
+    )
+    assert response.status_code == 200, response.text
+    response = await client.post("/auth/token", data={"username": username, "password": password})
+    assert response.status_code == 200, response.text
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
@@ -0,0 +1,52 @@
+"""Query budgets for the listing endpoints, so N+1 patterns fail the build"""
+import uuid
+import pytest
+
+
+async def create_links(client, auth_headers, count: int) -> list[dict]:
+    links = []
+    for index in range(count):
+        response = await client.post(
+            "/links/",
+            json={
+                "short_code": f"qb{uuid.uuid4().hex[:10]}",
+                "target_url": f"https://example.com/{index}",
+                "title": f"Budget {index}",
+            },
+            headers=auth_headers
+        )
+        assert response.status_code == 200, response.text
+        links.append(response.json())
+    return links
+
+
+@pytest.mark.asyncio
+async def test_list_links_query_budget(client, auth_headers, query_budget):
+    await create_links(client, auth_headers, 5)
+    
+    # Count and page, whatever the page size (owners are joined, not loaded per link)
+    response = await client.get("/links/", params={"limit": 5}, headers=auth_headers)
+    query_budget(response, 3)
+    query_budget(await client.get("/links/", params={"limit": 50}, headers=auth_headers), 3)
+    
+    # Cursor pages skip the count
+    first_page = response.json()
+    assert first_page["next_cursor"]
+    response = await client.get("/links/", params={"limit": 5, "cursor": first_page["next_cursor"]}, headers=auth_headers)
+    query_budget(response, 2)
+    assert response.json()["total"] is None
+    assert response.json()["links"][0]["id"] < first_page["links"][-1]["id"]
+
+
+@pytest.mark.asyncio
+async def test_link_audit_query_budget(client, auth_headers, query_budget):
+    link = (await create_links(client, auth_headers, 1))[0]
+    for index in range(5):
+        response = await client.put(f"/links/{link['id']}", json={"title": f"Renamed {index}"}, headers=auth_headers)
+        assert response.status_code == 200, response.text
+    
+    response = await client.get(f"/links/id/{link['id']}/audit", headers=auth_headers)
+    query_budget(response, 3)
+    assert len(response.json()["audit_logs"]) == 6
+    
+    query_budget(await client.get("/auth/me/audit", headers=auth_headers), 3)
@@ -14,6 +14,14 @@ const LinkStats: React.FC = () => {
     { enabled: !!shortCode }
   );
 
+  const { data: series } = useQuery(
+    ['link-stats-series', shortCode],
+    () => linksAPI.getLinkStatsSeries(shortCode!, { granularity: 'day' }),
+    { enabled: !!shortCode }
+  );
+  const points: { bucket_start: string; clicks: number; unique_visitors: number }[] = series?.points || [];
+  const maxClicks = Math.max(1, ...points.map((point) => point.clicks));
+
   if (isLoading) {
     return (
       <div className="text-center py-8">
@@ -93,6 +101,29 @@ const LinkStats: React.FC = () => {
         </div>
       </div>
 
+      <div className="card mb-8">
+        <div className="card-header">
+          <h2 className="text-lg font-medium text-gray-900">
+            Clicks per Day (last 30 days)
+          </h2>
+        </div>
+        <div className="card-body">
+          <div className="flex items-end h-32 gap-1">
+            {points.map((point) => (
+              <div
+                key={point.bucket_start}
+                className="flex-1 bg-primary-500 rounded-t"
+                style={{ height: `${(point.clicks / maxClicks) * 100}%` }}
+                title={`${new Date(point.bucket_start).toLocaleDateString()}: ${point.clicks} clicks, ~${point.unique_visitors} unique visitors`}
+              />
+            ))}
+          </div>
+          <p className="mt-2 text-sm text-gray-500">
+            {series?.total_clicks || 0} clicks in this period
+          </p>
+        </div>
+      </div>
+
       <div className="card">
         <div className="card-header">
           <h2 className="text-lg font-medium text-gray-900">
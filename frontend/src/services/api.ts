@@ -89,6 +89,15 @@ export const linksAPI = {
     const response = await api.get(`/links/stats/${shortCode}`);
     return response.data;
   },
+  
+  getLinkStatsSeries: async (shortCode: string, params?: {
+    granularity?: 'hour' | 'day';
+    start?: string;
+    end?: string;
+  }) => {
+    const response = await api.get(`/links/stats/${shortCode}/series`, { params });
+    return response.data;
+  },
 };
 
 export const healthAPI = {